@@ -0,0 +1,155 @@
+"""
+Benchmark the curve fitting of getPathFromPoints against the `beziers` package.
+
+The point sequences are the outer and inner sides of the strokes that the superellipse
+nib produces for the guide glyphs of the demo font, once sampled adaptively (as the
+pens do) and once densely at a fixed step. `beziers` is not a dependency of nibLib;
+if it is not installed, only the in-house fitter is timed.
+
+    python benchmarks/bench_fitting.py [--repeat N] [--error E]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+
+import numpy as np
+
+from defcon import Font
+from fontTools.pens.recordingPen import RecordingPen
+from math import radians
+from nibLib.geometry import (
+    getAdaptivePointsFromCurves,
+    getPathFromPoints,
+    getPointsFromCurves,
+    getSuperellipseTangentPoints,
+)
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, List, Sequence, Tuple
+
+try:
+    from beziers.path import BezierPath
+    from beziers.point import Point
+except ImportError:
+    BezierPath = None
+
+
+DEMO_FONT = Path(__file__).parent.parent / "demo" / "NibSimulator.ufo"
+GUIDE_LAYER = "background"
+
+ANGLE = radians(30)
+A = 30
+B = 5
+SUPERNESS = 2.5
+
+
+def collect_curves(font_path: str, layer_name: str) -> List[Tuple]:
+    """Return all cubic curve segments of the guide glyphs."""
+    layer = Font(font_path).layers[layer_name]
+    curves = []
+    for glyph in layer:
+        pen = RecordingPen()
+        glyph.draw(pen)
+        current = None
+        for operator, args in pen.value:
+            if operator == "curveTo":
+                curves.append((current,) + tuple(args))
+            if args:
+                current = args[-1]
+    return curves
+
+
+def stroke_sides(curves: Sequence[Tuple], adaptive: bool) -> List[np.ndarray]:
+    """Return the outer and inner stroke sides of each curve as point arrays."""
+    if adaptive:
+        points, tangents, offsets = getAdaptivePointsFromCurves(
+            curves, radius=max(A, B)
+        )
+    else:
+        points, tangents, offsets = getPointsFromCurves(curves, 5)
+    angles = np.arctan2(tangents[:, 1], tangents[:, 0]) + ANGLE
+    support = getSuperellipseTangentPoints(A, B, SUPERNESS, angles)
+    sides = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        sides.append(points[start:end] + support[start:end])
+        sides.append(points[start:end] - support[start:end])
+    return sides
+
+
+def fit_beziers(points: np.ndarray, error: float) -> int:
+    # beziers compares the squared distance against its error parameter
+    path = BezierPath().fromPoints(
+        [Point(x, y) for x, y in points.tolist()],
+        error=error * error,
+        cornerTolerance=1.0,
+        maxSegments=10000,
+    )
+    return len(path.asSegments())
+
+
+def fit_niblib(points: np.ndarray, error: float) -> int:
+    return len(getPathFromPoints(points, error=error)) - 1
+
+
+def time_fitter(
+    fitter: Callable[[np.ndarray, float], int],
+    sides: Sequence[np.ndarray],
+    error: float,
+    repeat: int,
+) -> Tuple[float, int]:
+    """Return the median time to fit all sides, and the number of curves."""
+    times = []
+    segments = 0
+    for _ in range(repeat):
+        t0 = perf_counter()
+        segments = sum(fitter(points, error) for points in sides)
+        times.append(perf_counter() - t0)
+    return statistics.median(times), segments
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--font", default=str(DEMO_FONT), help="The UFO to use")
+    parser.add_argument("--layer", default=GUIDE_LAYER, help="The guide layer")
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "-e", "--error", type=float, default=0.5, help="The maximum distance"
+    )
+    parsed = parser.parse_args(args)
+
+    curves = collect_curves(parsed.font, parsed.layer)
+    fitters = [("nibLib", fit_niblib)]
+    if BezierPath is None:
+        print("beziers is not installed, only timing the nibLib fitter.")
+    else:
+        fitters.append(("beziers", fit_beziers))
+
+    header = ("Sampling", "Fitter", "points", "time ms", "curves")
+    print("%-10s %-9s %8s %12s %10s" % header)
+    print("-" * 53)
+    for adaptive in (True, False):
+        sides = stroke_sides(curves, adaptive)
+        num_points = sum(len(points) for points in sides)
+        baseline = None
+        for name, fitter in fitters:
+            t, segments = time_fitter(fitter, sides, parsed.error, parsed.repeat)
+            line = "%-10s %-9s %8i %12.2f %10i" % (
+                "adaptive" if adaptive else "fixed",
+                name,
+                num_points,
+                1000 * t,
+                segments,
+            )
+            if baseline is None:
+                baseline = t
+            else:
+                line += "   %0.1f× slower" % (t / baseline)
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
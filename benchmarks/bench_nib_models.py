@@ -0,0 +1,221 @@
+"""
+Benchmark all nib models on the guide glyphs of the demo font.
+
+Each nib model is run in trace and in preview mode over a grid of nib angles, widths
+and (for superelliptical nibs) superness values. The timings per glyph and stage and
+the node counts of the output are reported.
+
+    python benchmarks/bench_nib_models.py [--repeat N] [--model NAME ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import statistics
+import sys
+
+from defcon import Font
+from fontTools.pens.recordingPen import RecordingPen
+from math import radians
+from nibLib.pens import nib_models
+from nibLib.pens.drawing import PenSink, RecordingSink
+from nibLib.pens.profiling import NibProfiler
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple
+
+
+DEMO_FONT = Path(__file__).parent.parent / "demo" / "NibSimulator.ufo"
+GUIDE_LAYER = "background"
+
+ANGLES = (0, 30, 45, 90)
+WIDTHS = (30, 60, 120)
+HEIGHT = 10
+SUPERNESS = (2.0, 2.5, 4.0)
+
+STAGES = ("setup", "stroke", "output")
+
+
+def count_nodes(recording: RecordingPen) -> int:
+    """Return the number of on- and off-curve points in a recorded drawing."""
+    return sum(len(args) for _, args in recording.value)
+
+
+def run_glyph(
+    pen_class,
+    guide: RecordingPen,
+    angle: float,
+    width: float,
+    superness: float,
+    trace: bool,
+    profiler: NibProfiler | None = None,
+) -> Tuple[Dict[str, float], int]:
+    """Stroke one guide glyph with one nib setting.
+
+    Returns:
+        Tuple[Dict[str, float], int]: The times per stage in seconds, and the number of
+            nodes in the output.
+    """
+    times = {}
+    out = RecordingPen()
+
+    t0 = perf_counter()
+    sink = RecordingSink()
+    p = pen_class(
+        None,
+        angle,
+        width,
+        HEIGHT,
+        nib_superness=superness,
+        trace=trace,
+        sink=sink,
+        profiler=profiler,
+    )
+    t1 = perf_counter()
+    guide.replay(p)
+    t2 = perf_counter()
+    if trace:
+        p.draw_traced(out)
+    else:
+        sink.replay(PenSink(out))
+    t3 = perf_counter()
+
+    times["setup"] = t1 - t0
+    times["stroke"] = t2 - t1
+    times["output"] = t3 - t2
+    return times, count_nodes(out)
+
+
+def settings_grid(model: str) -> List[Tuple[float, float, float]]:
+    """Return the nib settings (angle, width, superness) to run for a model."""
+    superness = SUPERNESS if model == "Superellipse" else (2.5,)
+    return list(itertools.product(ANGLES, WIDTHS, superness))
+
+
+def run(
+    glyphs: Dict[str, RecordingPen],
+    models: Sequence[str],
+    repeat: int,
+    profiler: NibProfiler | None = None,
+) -> List[Tuple[str, str, str, Dict[str, float], int]]:
+    """Run the benchmark.
+
+    Returns:
+        List[Tuple[str, str, str, Dict[str, float], int]]: For each model, mode and
+            glyph, the median total time per stage over all settings and the total
+            number of output nodes.
+    """
+    results = []
+    for model in models:
+        pen_class = nib_models[model]
+        grid = settings_grid(model)
+        for trace in (True, False):
+            mode = "trace" if trace else "preview"
+            for name, guide in glyphs.items():
+                totals = {stage: [] for stage in STAGES}
+                nodes = 0
+                for i in range(repeat):
+                    run_totals = dict.fromkeys(STAGES, 0.0)
+                    for angle, width, superness in grid:
+                        times, n = run_glyph(
+                            pen_class,
+                            guide,
+                            radians(angle),
+                            width,
+                            superness,
+                            trace,
+                            profiler,
+                        )
+                        for stage in STAGES:
+                            run_totals[stage] += times[stage]
+                        if i == 0:
+                            nodes += n
+                    for stage in STAGES:
+                        totals[stage].append(run_totals[stage])
+                medians = {
+                    stage: statistics.median(values) for stage, values in totals.items()
+                }
+                results.append((model, mode, name, medians, nodes))
+    return results
+
+
+def report(results, num_settings: Dict[str, int]) -> None:
+    """Print a table of the results, and the totals per model and mode."""
+    header = "%-12s %-7s %-10s" % ("Model", "Mode", "Glyph")
+    header += "".join("%10s" % f"{stage} ms" for stage in STAGES)
+    header += "%10s %8s" % ("total ms", "nodes")
+    print(header)
+    print("-" * len(header))
+    grand: Dict[Tuple[str, str], float] = {}
+    for model, mode, name, medians, nodes in results:
+        total = sum(medians.values())
+        line = "%-12s %-7s %-10s" % (model, mode, name)
+        line += "".join("%10.2f" % (1000 * medians[stage]) for stage in STAGES)
+        line += "%10.2f %8i" % (1000 * total, nodes)
+        print(line)
+        grand[model, mode] = grand.get((model, mode), 0.0) + total
+    print()
+    for (model, mode), total in grand.items():
+        print(
+            "%-12s %-7s %10.2f ms for %i settings"
+            % (model, mode, 1000 * total, num_settings[model])
+        )
+
+
+def report_profile(profiler: NibProfiler) -> None:
+    """Print the time per pen stage and the counters of a profiler."""
+    data = profiler.as_dict()
+    print()
+    print("%-20s %12s %10s" % ("Stage", "time ms", "calls"))
+    print("-" * 44)
+    for name, stage in sorted(data["stages"].items(), key=lambda s: -s[1]["time"]):
+        print("%-20s %12.2f %10i" % (name, 1000 * stage["time"], stage["calls"]))
+    print()
+    for name, value in sorted(data["counters"].items()):
+        print("%-20s %12i" % (name, value))
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--font", default=str(DEMO_FONT), help="The UFO to use")
+    parser.add_argument("--layer", default=GUIDE_LAYER, help="The guide layer")
+    parser.add_argument(
+        "-m", "--model", nargs="+", choices=list(nib_models.keys()), dest="models"
+    )
+    parser.add_argument("--glyphs", nargs="+", metavar="NAME")
+    parser.add_argument("-n", "--repeat", type=int, default=3)
+    parser.add_argument(
+        "-p", "--profile", action="store_true", help="Report the time per pen stage"
+    )
+    parser.add_argument(
+        "--chrome-trace", metavar="PATH", help="Write the pen stages as Chrome trace"
+    )
+    parsed = parser.parse_args(args)
+
+    font = Font(parsed.font)
+    layer = font.layers[parsed.layer]
+    names = parsed.glyphs or sorted(layer.keys())
+    glyphs = {}
+    for name in names:
+        pen = RecordingPen()
+        layer[name].draw(pen)
+        glyphs[name] = pen
+
+    profiler = None
+    if parsed.profile or parsed.chrome_trace:
+        profiler = NibProfiler(record_events=bool(parsed.chrome_trace))
+
+    models = parsed.models or list(nib_models.keys())
+    results = run(glyphs, models, parsed.repeat, profiler)
+    report(results, {model: len(settings_grid(model)) for model in models})
+
+    if profiler is not None:
+        report_profile(profiler)
+        if parsed.chrome_trace:
+            profiler.write_chrome_trace(parsed.chrome_trace)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
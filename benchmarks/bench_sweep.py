@@ -0,0 +1,104 @@
+"""
+Benchmark the nib angle sweep against one superellipse nib pen per angle.
+
+Each guide glyph of the demo font is stroked at a range of nib angles, once with
+`sweep_angles` and once by drawing the glyph into a new pen for each angle, in preview
+and in trace mode.
+
+    python benchmarks/bench_sweep.py [--repeat N] [--angles N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+
+import numpy as np
+
+from defcon import Font
+from fontTools.pens.recordingPen import RecordingPen
+from nibLib.pens.drawing import NullSink
+from nibLib.pens.superellipseNibPen import SuperellipseNibPen
+from nibLib.sweep import sweep_angles
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, List
+
+
+DEMO_FONT = Path(__file__).parent.parent / "demo" / "NibSimulator.ufo"
+GUIDE_LAYER = "background"
+
+WIDTH = 60
+HEIGHT = 10
+SUPERNESS = 2.5
+
+
+def stroke_with_pens(guide: RecordingPen, angles: np.ndarray, trace: bool) -> None:
+    for angle in angles:
+        p = SuperellipseNibPen(
+            None,
+            angle,
+            WIDTH,
+            HEIGHT,
+            nib_superness=SUPERNESS,
+            trace=trace,
+            sink=NullSink(),
+        )
+        guide.replay(p)
+
+
+def stroke_with_sweep(guide: RecordingPen, angles: np.ndarray, trace: bool) -> None:
+    sweep_angles(guide.value, angles, WIDTH, HEIGHT, SUPERNESS, trace=trace)
+
+
+def time_function(function: Callable[[], None], repeat: int) -> float:
+    """Return the median time of a function call."""
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        function()
+        times.append(perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main(args: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--font", default=str(DEMO_FONT), help="The UFO to use")
+    parser.add_argument("--layer", default=GUIDE_LAYER, help="The guide layer")
+    parser.add_argument("-n", "--repeat", type=int, default=3)
+    parser.add_argument(
+        "-a", "--angles", type=int, default=36, help="The number of nib angles"
+    )
+    parsed = parser.parse_args(args)
+
+    layer = Font(parsed.font).layers[parsed.layer]
+    angles = np.linspace(0, np.pi, parsed.angles, endpoint=False)
+
+    print("%-10s %-7s %12s %12s %8s" % ("Glyph", "Mode", "pens ms", "sweep ms", ""))
+    print("-" * 53)
+    for name in sorted(layer.keys()):
+        guide = RecordingPen()
+        layer[name].draw(guide)
+        for trace in (False, True):
+            t_pens = time_function(
+                lambda: stroke_with_pens(guide, angles, trace), parsed.repeat
+            )
+            t_sweep = time_function(
+                lambda: stroke_with_sweep(guide, angles, trace), parsed.repeat
+            )
+            print(
+                "%-10s %-7s %12.2f %12.2f %7.1f×"
+                % (
+                    name,
+                    "trace" if trace else "preview",
+                    1000 * t_pens,
+                    1000 * t_sweep,
+                    t_pens / t_sweep,
+                )
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,7 @@ DEBUG_CURVE_POINTS = False
 
 extensionID = "de.kutilek.NibSimulator"
 rf_guide_key = "%s.%s" % (extensionID, "guide_glyph")
+rf_stroke_key = "%s.%s" % (extensionID, "stroke")
 def_angle_key = "%s.%s" % (extensionID, "angle")
 def_width_key = "%s.%s" % (extensionID, "width")
 def_height_key = "%s.%s" % (extensionID, "height")
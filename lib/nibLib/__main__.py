@@ -0,0 +1,6 @@
+import sys
+
+from nibLib.cli import main
+
+
+sys.exit(main())
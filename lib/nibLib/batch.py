@@ -0,0 +1,577 @@
+from __future__ import annotations
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from fontTools.pens.recordingPen import RecordingPen, replayRecording
+from functools import partial
+from math import degrees, radians
+from nibLib.cache import StrokeCache, resolved_drawing_key
+from nibLib import (
+    def_angle_key,
+    def_width_key,
+    def_height_key,
+    def_guide_key,
+    def_super_key,
+    def_model_key,
+)
+from typing import Any, Callable, Dict, List, Mapping, Sequence, Tuple
+
+# A glyph drawing as recorded by a fontTools RecordingPen. Recordings can be pickled,
+# so they are used to send guide glyphs to the worker processes and to send the
+# traced results back.
+Recording = List[Tuple[str, Tuple[Any, ...]]]
+
+# The strokes of component base glyphs, shared by all traces in a process. The keys
+# contain the drawing of the base glyph and the nib settings.
+_component_cache = StrokeCache(size=1024)
+
+
+@dataclass
+class NibSettings:
+    """The nib parameters for a trace. The defaults match those of the nib UI."""
+
+    model: str = "Superellipse"
+    angle: float = radians(30)  # The nib's angle in radians.
+    width: float = 60
+    height: float = 2
+    superness: float = 2.5
+
+    @classmethod
+    def from_lib(cls, lib, **overrides) -> NibSettings:
+        """Return the settings that the nib UI has stored in a font or glyph lib.
+
+        Args:
+            lib (Dict): The lib to read the settings from.
+            overrides: Settings that take precedence over the stored ones. Values of
+                None are ignored.
+
+        Returns:
+            NibSettings: The settings.
+        """
+        settings = cls()
+        angle = lib.get(def_angle_key)
+        if angle is not None:
+            settings.angle = radians(angle)
+        for libkey, attr in [
+            (def_width_key, "width"),
+            (def_height_key, "height"),
+            (def_super_key, "superness"),
+            (def_model_key, "model"),
+        ]:
+            value = lib.get(libkey)
+            if value is not None:
+                setattr(settings, attr, value)
+        for attr, value in overrides.items():
+            if value is not None:
+                setattr(settings, attr, value)
+        return settings
+
+
+# A guide glyph to trace with its nib settings and the recorded drawings of its
+# component base glyphs
+Task = Tuple[Recording, NibSettings, Dict[str, Recording]]
+
+
+def trace_recording(
+    recording: Recording,
+    settings: NibSettings,
+    round_coords=False,
+    remove_overlap=False,
+    correct_direction=False,
+    compatible=False,
+    components: Mapping[str, Recording] | None = None,
+    component_cache: StrokeCache | None = None,
+) -> Recording:
+    """Trace a recorded guide glyph drawing with the nib.
+
+    Args:
+        recording (Recording): The recorded drawing of the guide glyph.
+        settings (NibSettings): The nib settings.
+        round_coords (bool, optional): Whether the coordinates of the resulting path
+            should be rounded. Defaults to False.
+        remove_overlap (bool, optional): Whether to combine the stroke pieces into one
+            outline. Needs `skia-pathops`. Defaults to False.
+        correct_direction (bool, optional): Whether to correct the contour direction
+            when removing overlaps. Defaults to False.
+        compatible (bool, optional): Whether to sample and fit curves with a fixed
+            number of points and segments, so that traces of the same guide drawing
+            with different nib settings are compatible. Defaults to False.
+        components (Mapping[str, Recording] | None, optional): The recorded drawings
+            of the component base glyphs, by glyph name. Components whose base glyph
+            is missing are ignored. Defaults to None.
+        component_cache (StrokeCache | None, optional): A cache for the strokes of the
+            base glyphs, which can be shared by several traces. Defaults to None.
+
+    Returns:
+        Recording: The recorded drawing of the traced outline.
+    """
+    from nibLib.pens import nib_models
+
+    out = RecordingPen()
+    pen = nib_models[settings.model](
+        recording_glyph_set(components) if components else None,
+        settings.angle,
+        settings.width,
+        settings.height,
+        nib_superness=settings.superness,
+        trace=True,
+        round_coords=round_coords,
+        # Without overlap removal, the contours are streamed to the output
+        out_pen=None if remove_overlap else out,
+        compatible=compatible,
+        component_cache=component_cache,
+    )
+    replayRecording(recording, pen)
+    if remove_overlap:
+        pen.draw_traced(out, remove_overlap=True, correct_direction=correct_direction)
+    return out.value
+
+
+def record_glyph(glyph) -> Recording:
+    """Return the recorded drawing of a glyph.
+
+    Args:
+        glyph (Glyph): The glyph.
+
+    Returns:
+        Recording: The recorded drawing.
+    """
+    pen = RecordingPen()
+    glyph.draw(pen)
+    return pen.value
+
+
+def component_bases(
+    recording: Recording, get_base: Callable[[str], Recording | None]
+) -> Dict[str, Recording]:
+    """Return the recorded drawings of the base glyphs of all components in a
+    recording, including the components of the base glyphs.
+
+    Args:
+        recording (Recording): The recorded drawing.
+        get_base (Callable[[str], Recording | None]): A function that returns the
+            recorded drawing of a base glyph by name, or None if it is missing.
+
+    Returns:
+        Dict[str, Recording]: The recorded drawings of the base glyphs, by name.
+    """
+    bases: Dict[str, Recording] = {}
+    pending = [recording]
+    while pending:
+        for operator, args in pending.pop():
+            if operator != "addComponent" or args[0] in bases:
+                continue
+            base = get_base(args[0])
+            if base is not None:
+                bases[args[0]] = base
+                pending.append(base)
+    return bases
+
+
+def recording_glyph_set(components: Mapping[str, Recording]) -> Dict[str, Any]:
+    """Return a glyph set for the nib pens, made from recorded drawings.
+
+    Args:
+        components (Mapping[str, Recording]): The recorded drawings of the base
+            glyphs, by name.
+
+    Returns:
+        Dict[str, RecordingPen]: The glyph set.
+    """
+    glyph_set = {}
+    for name, recording in components.items():
+        glyph_set[name] = RecordingPen()
+        glyph_set[name].value = recording
+    return glyph_set
+
+
+def _layer_recorder(layer) -> Callable[[str], Recording | None]:
+    # Return a function that records the glyphs of a layer, recording each glyph only
+    # once
+    recordings: Dict[str, Recording] = {}
+
+    def record(name: str) -> Recording | None:
+        if name not in recordings:
+            if name not in layer:
+                return None
+            recordings[name] = record_glyph(layer[name])
+        return recordings[name]
+
+    return record
+
+
+def record_guide(
+    guide, glyph_set=None
+) -> Tuple[RecordingPen, Dict[str, Any], Tuple[Any, ...]]:
+    """Record a guide glyph and the base glyphs of its components, e.g. to stroke it
+    later on another thread.
+
+    Args:
+        guide (Glyph): The guide glyph.
+        glyph_set (Layer | None, optional): The glyph set that contains the base
+            glyphs of the components. Defaults to None, i.e. components are ignored.
+
+    Returns:
+        Tuple[RecordingPen, Dict[str, Any], Tuple[Any, ...]]: The recorded drawing,
+            the glyph set of the recorded base glyphs, and a hashable key for the
+            contents of both.
+    """
+    recording = RecordingPen()
+    guide.draw(recording)
+    bases: Dict[str, Any] = {}
+    if glyph_set is not None:
+        bases = recording_glyph_set(
+            component_bases(recording.value, _layer_recorder(glyph_set))
+        )
+    return recording, bases, resolved_drawing_key(recording, bases.get)
+
+
+def _trace_task(task: Task, **kwargs) -> Recording:
+    # Trace a recording with its own settings, in a worker process
+    recording, settings, components = task
+    return trace_recording(
+        recording,
+        settings,
+        components=components,
+        component_cache=_component_cache,
+        **kwargs,
+    )
+
+
+def _map_traces(tasks: Sequence[Task], jobs: int | None, **kwargs) -> List[Recording]:
+    # Trace the guide glyphs with their own settings, using a process pool
+    trace = partial(_trace_task, **kwargs)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(tasks) < 2:
+        return [trace(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunksize = max(1, len(tasks) // (4 * jobs))
+        return list(executor.map(trace, tasks, chunksize=chunksize))
+
+
+def trace_recordings(
+    recordings: Sequence[Recording],
+    settings: NibSettings,
+    round_coords=False,
+    jobs: int | None = None,
+    remove_overlap=False,
+    correct_direction=False,
+    compatible=False,
+    components: Mapping[str, Recording] | None = None,
+) -> List[Recording]:
+    """Trace a sequence of recorded guide glyph drawings, using a process pool.
+
+    Args:
+        recordings (Sequence[Recording]): The recorded guide glyph drawings.
+        settings (NibSettings): The nib settings.
+        round_coords (bool, optional): Whether the coordinates of the resulting paths
+            should be rounded. Defaults to False.
+        jobs (int | None, optional): The number of worker processes. If 1, the glyphs
+            are traced in the current process. Defaults to None, i.e. the number of
+            CPUs.
+        remove_overlap (bool, optional): Whether to combine the stroke pieces of each
+            glyph into one outline. Needs `skia-pathops`. Defaults to False.
+        correct_direction (bool, optional): Whether to correct the contour direction
+            when removing overlaps. Defaults to False.
+        compatible (bool, optional): Whether to sample and fit curves with a fixed
+            number of points and segments. Defaults to False.
+        components (Mapping[str, Recording] | None, optional): The recorded drawings
+            of the component base glyphs, by glyph name. Defaults to None, i.e.
+            components are ignored.
+
+    Returns:
+        List[Recording]: The traced outlines, in the order of the input.
+    """
+    get_base = (components or {}).get
+    return _map_traces(
+        [
+            (recording, settings, component_bases(recording, get_base))
+            for recording in recordings
+        ],
+        jobs,
+        round_coords=round_coords,
+        remove_overlap=remove_overlap,
+        correct_direction=correct_direction,
+        compatible=compatible,
+    )
+
+
+def check_compatibility(
+    recordings: Sequence[Recording], labels: Sequence[str] | None = None
+) -> str | None:
+    """Check whether recorded drawings have the same point structure, i.e. the same
+    contours with the same segment types, so they can be interpolated.
+
+    Args:
+        recordings (Sequence[Recording]): The recorded drawings.
+        labels (Sequence[str] | None, optional): The names of the drawings for the
+            description of a difference. Defaults to None, i.e. "drawing 0",
+            "drawing 1", etc.
+
+    Returns:
+        str | None: A description of the first difference from the first drawing, or
+            None if all drawings are compatible.
+    """
+    if labels is None:
+        labels = ["drawing %i" % i for i in range(len(recordings))]
+    structures = [
+        [(operator, len(args)) for operator, args in recording]
+        for recording in recordings
+    ]
+    for i in range(1, len(structures)):
+        reference = structures[0]
+        structure = structures[i]
+        if structure == reference:
+            continue
+        contours = [
+            sum(1 for operator, _ in s if operator in ("closePath", "endPath"))
+            for s in (reference, structure)
+        ]
+        if contours[0] != contours[1]:
+            return "%s has %i contours, %s has %i" % (
+                labels[0],
+                contours[0],
+                labels[i],
+                contours[1],
+            )
+        contour = 0
+        for a, b in zip(reference, structure):
+            if a != b:
+                break
+            if a[0] in ("closePath", "endPath"):
+                contour += 1
+        return "%s and %s differ in contour %i" % (labels[0], labels[i], contour)
+    return None
+
+
+def _resolve_layers(font, guide_layer: str | None, target_layer: str | None):
+    # Return the guide and target layers of a font, creating the target layer if
+    # needed
+    if guide_layer is None:
+        guide_layer = font.lib.get(def_guide_key)
+        if guide_layer not in font.layers:
+            guide_layer = font.layers.layerOrder[-1]
+    guide = font.layers[guide_layer]
+
+    if target_layer is None:
+        target = font.layers.defaultLayer
+    elif target_layer in font.layers:
+        target = font.layers[target_layer]
+    else:
+        target = font.newLayer(target_layer)
+
+    if target is guide:
+        raise ValueError(f"The guide layer '{guide.name}' can't be the target layer.")
+    return guide, target
+
+
+def _write_glyph(guide, target, name: str, recording: Recording) -> None:
+    # Replace the outline of a glyph in the target layer with a traced recording
+    if name in target:
+        glyph = target[name]
+        # Composite guides are traced with their components decomposed
+        glyph.clearContours()
+        glyph.clearComponents()
+    else:
+        glyph = target.newGlyph(name)
+        glyph.width = guide[name].width
+    replayRecording(recording, glyph.getPen())
+
+
+def trace_font(
+    font,
+    settings: NibSettings | None = None,
+    guide_layer: str | None = None,
+    target_layer: str | None = None,
+    glyph_names: Sequence[str] | None = None,
+    round_coords=False,
+    jobs: int | None = None,
+    remove_overlap=False,
+    correct_direction=False,
+    compatible=False,
+) -> Dict[str, str]:
+    """Trace the guide layer of all glyphs in a defcon font into a target layer.
+
+    Args:
+        font (defcon.Font): The font.
+        settings (NibSettings | None, optional): The nib settings. Defaults to None,
+            i.e. the settings stored in the font lib.
+        guide_layer (str | None, optional): The name of the layer that contains the
+            guide paths. Defaults to None, i.e. the guide layer stored in the font lib,
+            or the last layer of the font.
+        target_layer (str | None, optional): The name of the layer that receives the
+            traced outlines. It is created if it doesn't exist. Defaults to None, i.e.
+            the default layer.
+        glyph_names (Sequence[str] | None, optional): The names of the glyphs to trace.
+            Defaults to None, i.e. all glyphs in the guide layer.
+        round_coords (bool, optional): Whether the coordinates of the resulting paths
+            should be rounded. Defaults to False.
+        jobs (int | None, optional): The number of worker processes. Defaults to None,
+            i.e. the number of CPUs.
+        remove_overlap (bool, optional): Whether to combine the stroke pieces of each
+            glyph into one outline. Needs `skia-pathops`. Defaults to False.
+        correct_direction (bool, optional): Whether to correct the contour direction
+            when removing overlaps. Defaults to False.
+        compatible (bool, optional): Whether to sample and fit curves with a fixed
+            number of points and segments. Defaults to False.
+
+    Returns:
+        Dict[str, str]: The names of glyphs which were skipped, with the reason.
+    """
+    if settings is None:
+        settings = NibSettings.from_lib(font.lib)
+
+    guide, target = _resolve_layers(font, guide_layer, target_layer)
+
+    skipped: Dict[str, str] = {}
+    names = []
+    if glyph_names is None:
+        glyph_names = [name for name in font.glyphOrder if name in guide]
+        glyph_names += sorted(set(guide.keys()) - set(glyph_names))
+    for name in glyph_names:
+        if name not in guide:
+            skipped[name] = "not in guide layer"
+        elif not len(guide[name]) and not guide[name].components:
+            skipped[name] = "no contours or components in guide layer"
+        else:
+            names.append(name)
+
+    record = _layer_recorder(guide)
+    tasks = [
+        (record(name), settings, component_bases(record(name), record))
+        for name in names
+    ]
+    results = _map_traces(
+        tasks,
+        jobs,
+        round_coords=round_coords,
+        remove_overlap=remove_overlap,
+        correct_direction=correct_direction,
+        compatible=compatible,
+    )
+    for name, recording in zip(names, results):
+        _write_glyph(guide, target, name, recording)
+
+    return skipped
+
+
+def trace_masters(
+    fonts: Sequence,
+    settings: Sequence[NibSettings] | None = None,
+    guide_layer: str | None = None,
+    target_layer: str | None = None,
+    glyph_names: Sequence[str] | None = None,
+    round_coords=False,
+    jobs: int | None = None,
+    remove_overlap=False,
+    correct_direction=False,
+    compatible=True,
+) -> Dict[str, str]:
+    """Trace the guide layers of the masters of a family, and check that the traced
+    outlines of each glyph are compatible across the masters. The glyphs of all
+    masters are traced in one process pool.
+
+    Only glyphs that have contours in the guide layers of all masters are traced.
+
+    Args:
+        fonts (Sequence[defcon.Font]): The master fonts.
+        settings (Sequence[NibSettings] | None, optional): The nib settings for each
+            master. Defaults to None, i.e. the settings stored in each font lib.
+        guide_layer (str | None, optional): The name of the layer that contains the
+            guide paths. Defaults to None, i.e. the guide layer stored in each font
+            lib, or the last layer of each font.
+        target_layer (str | None, optional): The name of the layer that receives the
+            traced outlines. It is created if it doesn't exist. Defaults to None, i.e.
+            the default layer.
+        glyph_names (Sequence[str] | None, optional): The names of the glyphs to trace.
+            Defaults to None, i.e. all glyphs in the guide layer of the first master.
+        round_coords (bool, optional): Whether the coordinates of the resulting paths
+            should be rounded. Defaults to False.
+        jobs (int | None, optional): The number of worker processes. Defaults to None,
+            i.e. the number of CPUs.
+        remove_overlap (bool, optional): Whether to combine the stroke pieces of each
+            glyph into one outline. Needs `skia-pathops`. The combined outlines are
+            often not compatible. Defaults to False.
+        correct_direction (bool, optional): Whether to correct the contour direction
+            when removing overlaps. Defaults to False.
+        compatible (bool, optional): Whether to sample and fit curves with a fixed
+            number of points and segments, so the same guide drawing gives the same
+            point structure with the nib settings of each master. Defaults to True.
+
+    Returns:
+        Dict[str, str]: The names of glyphs which were skipped or whose traced outlines
+            are not compatible, with the reason.
+    """
+    if settings is None:
+        settings = [NibSettings.from_lib(font.lib) for font in fonts]
+    if len(settings) != len(fonts):
+        raise ValueError(f"Expected nib settings for each of the {len(fonts)} masters.")
+    if not fonts:
+        return {}
+
+    layers = [_resolve_layers(font, guide_layer, target_layer) for font in fonts]
+
+    skipped: Dict[str, str] = {}
+    names = []
+    if glyph_names is None:
+        first_guide = layers[0][0]
+        glyph_names = [name for name in fonts[0].glyphOrder if name in first_guide]
+        glyph_names += sorted(set(first_guide.keys()) - set(glyph_names))
+    for name in glyph_names:
+        for i, (guide, _) in enumerate(layers):
+            if name not in guide:
+                skipped[name] = "not in guide layer of master %i" % i
+                break
+            if not len(guide[name]) and not guide[name].components:
+                skipped[name] = (
+                    "no contours or components in guide layer of master %i" % i
+                )
+                break
+        else:
+            names.append(name)
+
+    recorders = [_layer_recorder(guide) for guide, _ in layers]
+    tasks = [
+        (record(name), master_settings, component_bases(record(name), record))
+        for name in names
+        for record, master_settings in zip(recorders, settings)
+    ]
+    results = _map_traces(
+        tasks,
+        jobs,
+        round_coords=round_coords,
+        remove_overlap=remove_overlap,
+        correct_direction=correct_direction,
+        compatible=compatible,
+    )
+
+    num_masters = len(fonts)
+    labels = ["master %i" % i for i in range(num_masters)]
+    for index, name in enumerate(names):
+        recordings = results[index * num_masters : (index + 1) * num_masters]
+        problem = check_compatibility(recordings, labels)
+        if problem is not None:
+            skipped[name] = "incompatible: " + problem
+        for (guide, target), recording in zip(layers, recordings):
+            _write_glyph(guide, target, name, recording)
+
+    return skipped
+
+
+def describe_settings(settings: NibSettings) -> str:
+    """Return a human-readable description of the nib settings."""
+    return "%s nib, %0.1f°, %g × %g%s" % (
+        settings.model,
+        degrees(settings.angle),
+        settings.width,
+        settings.height,
+        (
+            ", superness %0.2f" % settings.superness
+            if settings.model == "Superellipse"
+            else ""
+        ),
+    )
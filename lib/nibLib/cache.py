@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from fontTools.pens.recordingPen import RecordingPen
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+def record_drawing(glyph) -> RecordingPen:
+    """Record the drawing of a glyph or layer.
+
+    Args:
+        glyph (Glyph): The glyph or layer.
+
+    Returns:
+        RecordingPen: The pen with the recorded drawing.
+    """
+    pen = RecordingPen()
+    glyph.draw(pen)
+    return pen
+
+
+def drawing_key(recording: RecordingPen) -> Tuple[Any, ...]:
+    """Return a hashable key for the contents of a recorded drawing. Drawings with the
+    same contours and components have equal keys.
+
+    Args:
+        recording (RecordingPen): The recorded drawing.
+
+    Returns:
+        Tuple[Any, ...]: The key.
+    """
+    return tuple(
+        (operator, tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args))
+        for operator, args in recording.value
+    )
+
+
+def resolved_drawing_key(
+    recording: RecordingPen, get_base: Callable[[str], RecordingPen | None]
+) -> Tuple[Any, ...]:
+    """Return a hashable key for the contents of a recorded drawing and of the base
+    glyphs of its components, including the components of the base glyphs. Unlike
+    `drawing_key`, the key changes when a base glyph changes.
+
+    Args:
+        recording (RecordingPen): The recorded drawing.
+        get_base (Callable[[str], RecordingPen | None]): A function that returns the
+            recorded drawing of a base glyph by name, or None if it is missing.
+
+    Returns:
+        Tuple[Any, ...]: The key.
+    """
+    bases: Dict[str, Tuple[Any, ...]] = {}
+    pending = [recording]
+    while pending:
+        for operator, args in pending.pop().value:
+            if operator != "addComponent" or args[0] in bases:
+                continue
+            base = get_base(args[0])
+            if base is not None:
+                bases[args[0]] = drawing_key(base)
+                pending.append(base)
+    return (drawing_key(recording),) + tuple(
+        (name, bases[name]) for name in sorted(bases)
+    )
+
+
+class StrokeCache:
+    """
+    A bounded cache for stroke results, e.g. for the stroked outlines of the guide
+    glyphs in the preview. The least recently used entries are discarded when the
+    cache is full.
+    """
+
+    def __init__(self, size=256) -> None:
+        """Initialize the cache.
+
+        Args:
+            size (int, optional): The maximum number of entries. Defaults to 256.
+        """
+        self.size = size
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached result for a key.
+
+        Args:
+            key (Hashable): The key.
+
+        Returns:
+            Any: The result, or None if it is not in the cache.
+        """
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return result
+
+    def set(self, key: Hashable, result: Any) -> None:
+        """Store the result for a key.
+
+        Args:
+            key (Hashable): The key.
+            result (Any): The result.
+        """
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self._entries.clear()
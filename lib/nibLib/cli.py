@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import argparse
+
+from math import radians
+from nibLib.batch import NibSettings, describe_settings, trace_font, trace_masters
+from typing import List
+
+
+def _trace(args: argparse.Namespace) -> int:
+    from defcon import Font
+
+    if args.remove_overlap:
+        try:
+            import pathops  # noqa: F401
+        except ImportError:
+            print("Removing overlaps needs the package skia-pathops.")
+            return 1
+
+    if len(args.ufo) > 1:
+        return _trace_masters(args)
+
+    ufo = args.ufo[0]
+    font = Font(ufo)
+    settings = _settings(font, args)
+    print(f"Tracing {ufo} with {describe_settings(settings)} ...")
+    skipped = trace_font(
+        font,
+        settings,
+        guide_layer=args.guide_layer,
+        target_layer=args.target_layer,
+        glyph_names=args.glyphs,
+        round_coords=args.round,
+        jobs=args.jobs,
+        remove_overlap=args.remove_overlap,
+        correct_direction=args.correct_direction,
+        compatible=args.compatible,
+    )
+    if args.verbose:
+        for name, reason in skipped.items():
+            print(f"Skipped {name}: {reason}")
+    font.save(args.output or ufo)
+    return 0
+
+
+def _settings(font, args: argparse.Namespace) -> NibSettings:
+    # Return the nib settings from the font lib, overridden by the arguments
+    return NibSettings.from_lib(
+        font.lib,
+        model=args.model,
+        angle=None if args.angle is None else radians(args.angle),
+        width=args.width,
+        height=args.height,
+        superness=args.superness,
+    )
+
+
+def _trace_masters(args: argparse.Namespace) -> int:
+    from defcon import Font
+
+    if args.output:
+        print("--output can only be used with a single UFO.")
+        return 1
+
+    fonts = [Font(ufo) for ufo in args.ufo]
+    settings = [_settings(font, args) for font in fonts]
+    for ufo, master_settings in zip(args.ufo, settings):
+        print(f"Tracing {ufo} with {describe_settings(master_settings)} ...")
+    problems = trace_masters(
+        fonts,
+        settings,
+        guide_layer=args.guide_layer,
+        target_layer=args.target_layer,
+        glyph_names=args.glyphs,
+        round_coords=args.round,
+        jobs=args.jobs,
+        remove_overlap=args.remove_overlap,
+        correct_direction=args.correct_direction,
+    )
+    for name, reason in problems.items():
+        if reason.startswith("incompatible"):
+            print(f"Glyph {name} is {reason}")
+        elif args.verbose:
+            print(f"Skipped {name}: {reason}")
+    for font in fonts:
+        font.save()
+    return 0
+
+
+def main(args: List[str] | None = None) -> int:
+    """The command line interface of nibLib.
+
+    Args:
+        args (List[str] | None, optional): The arguments. Defaults to None, i.e. the
+            arguments of the current process.
+
+    Returns:
+        int: The exit code.
+    """
+    from nibLib.pens import nib_models
+
+    parser = argparse.ArgumentParser(
+        prog="nibLib", description="Nib simulation for font editors"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    trace = subparsers.add_parser(
+        "trace",
+        help="Trace the guide layer of a UFO with a nib",
+        description="Trace the guide layer of all glyphs in a UFO with a nib. Nib "
+        "settings which are not given are read from the font lib, as stored by the "
+        "nib UI.",
+    )
+    trace.add_argument(
+        "ufo",
+        nargs="+",
+        help="The UFO font to trace. When several UFOs are given, they are traced as "
+        "masters of a family, and the outlines are checked for compatibility",
+    )
+    trace.add_argument("-m", "--model", choices=list(nib_models.keys()))
+    trace.add_argument("-a", "--angle", type=float, help="The nib angle in degrees")
+    trace.add_argument("-w", "--width", type=float, help="The nib width")
+    trace.add_argument("-H", "--height", type=float, help="The nib height")
+    trace.add_argument(
+        "-s", "--superness", type=float, help="The superness of superellipse nibs"
+    )
+    trace.add_argument(
+        "-g",
+        "--guide-layer",
+        help="The layer containing the guide paths. Defaults to the guide layer "
+        "stored in the font lib, or the last layer",
+    )
+    trace.add_argument(
+        "-t",
+        "--target-layer",
+        help="The layer to write the traced outlines to. Defaults to the default layer",
+    )
+    trace.add_argument("-o", "--output", help="Save to this UFO instead of the input")
+    trace.add_argument(
+        "--glyphs", nargs="+", help="Only trace these glyphs", metavar="NAME"
+    )
+    trace.add_argument(
+        "-r", "--round", action="store_true", help="Round the output coordinates"
+    )
+    trace.add_argument(
+        "--remove-overlap",
+        action="store_true",
+        help="Combine the stroke pieces of each glyph into one outline. Needs "
+        "skia-pathops",
+    )
+    trace.add_argument(
+        "--correct-direction",
+        action="store_true",
+        help="Correct the contour direction when removing overlaps",
+    )
+    trace.add_argument(
+        "--compatible",
+        action="store_true",
+        help="Use the same point structure for all nib settings, so the outlines can "
+        "be interpolated with those traced from other masters. Always used when "
+        "tracing several UFOs",
+    )
+    trace.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="The number of worker processes. Defaults to the number of CPUs",
+    )
+    trace.add_argument("-v", "--verbose", action="store_true")
+    trace.set_defaults(func=_trace)
+
+    parsed = parser.parse_args(args)
+    return parsed.func(parsed)
@@ -0,0 +1,353 @@
+"""
+Fit cubic Bézier curves to a sequence of points.
+
+This is a NumPy implementation of the algorithm by Philip J. Schneider ("An Algorithm
+for Automatically Fitting Digitized Curves", Graphics Gems, 1990), with the corner
+detection of Inkscape's bezier-utils. All computations for one piece of the point
+sequence are done on arrays, so no per-point objects are created.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from math import sqrt
+from nibLib.typing import TPoint
+from typing import List, Sequence, Tuple
+
+
+# The number of attempts to improve a fit by reparameterization before it is split
+MAX_ITERATIONS = 4
+
+EPSILON = np.finfo(float).eps
+
+
+def _bernstein(u: np.ndarray) -> np.ndarray:
+    """Return the cubic Bernstein polynomials at the parameters u, shape (N, 4)."""
+    mu = 1 - u
+    b = np.empty((len(u), 4))
+    b[:, 0] = mu * mu * mu
+    b[:, 1] = 3 * u * mu * mu
+    b[:, 2] = 3 * u * u * mu
+    b[:, 3] = u * u * u
+    return b
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    """Return a vector scaled to length 1, or the vector itself if it is zero."""
+    length = sqrt(v[0] * v[0] + v[1] * v[1])
+    if length == 0:
+        return v
+    return v / length
+
+
+def _endTangent(points: np.ndarray, error: float) -> np.ndarray:
+    """Return the unit tangent at the first point, pointing into the point sequence.
+    The first point that is farther away than `error` is used, so the tangent is not
+    disturbed by noise.
+    """
+    d = points[1:] - points[0]
+    far = np.flatnonzero(np.einsum("ij,ij->i", d, d) > error * error)
+    return _unit(d[far[0]] if len(far) else d[-1])
+
+
+def _fitLine(
+    points: np.ndarray, tan1: np.ndarray | None, tan2: np.ndarray | None
+) -> np.ndarray:
+    """Return a cubic Bézier curve for two points."""
+    p0 = points[0]
+    p3 = points[-1]
+    dist = np.hypot(*(p3 - p0)) / 3
+    p1 = (2 * p0 + p3) / 3 if tan1 is None else p0 + tan1 * dist
+    p2 = (2 * p3 + p0) / 3 if tan2 is None else p3 + tan2 * dist
+    return np.array((p0, p1, p2, p3))
+
+
+def _estimateLengths(
+    points: np.ndarray, b: np.ndarray, tan1: np.ndarray, tan2: np.ndarray
+) -> np.ndarray:
+    """Return the least-squares fit of a cubic Bézier curve with the given end points
+    and tangent directions. Only the lengths of the handles are fitted.
+
+    Args:
+        points (np.ndarray): The points, shape (N, 2).
+        b (np.ndarray): The Bernstein polynomials at the parameters, shape (N, 4).
+        tan1 (np.ndarray): The unit tangent at the start.
+        tan2 (np.ndarray): The unit tangent at the end.
+
+    Returns:
+        np.ndarray: The control points, shape (4, 2).
+    """
+    p0 = points[0]
+    p3 = points[-1]
+    b1 = b[:, 1]
+    b2 = b[:, 2]
+    c00 = b1 @ b1
+    c01 = (b1 @ b2) * (tan1 @ tan2)
+    c11 = b2 @ b2
+    shortfall = points - (b[:, 0] + b1)[:, None] * p0 - (b2 + b[:, 3])[:, None] * p3
+    x0 = (b1 @ shortfall) @ tan1
+    x1 = (b2 @ shortfall) @ tan2
+
+    det = c00 * c11 - c01 * c01
+    if det != 0:
+        alpha_l = (x0 * c11 - x1 * c01) / det
+        alpha_r = (c00 * x1 - c01 * x0) / det
+    else:
+        c0 = c00 + c01
+        alpha_l = alpha_r = x0 / c0 if c0 != 0 else 0.0
+
+    if alpha_l < 1e-6 or alpha_r < 1e-6:
+        # The fit is degenerate, use the heuristic of Wu and Barsky
+        alpha_l = alpha_r = np.hypot(*(p3 - p0)) / 3
+
+    return np.array((p0, p0 + tan1 * alpha_l, p3 + tan2 * alpha_r, p3))
+
+
+def _generateBezier(
+    points: np.ndarray,
+    b: np.ndarray,
+    tan1: np.ndarray | None,
+    tan2: np.ndarray | None,
+    error: float,
+) -> np.ndarray:
+    """Return a cubic Bézier curve fitted to the points, with the Bernstein polynomials
+    at the parameters of the points. Tangents that are None are estimated from the
+    points.
+    """
+    est1 = _endTangent(points, error) if tan1 is None else tan1
+    est2 = _endTangent(points[::-1], error) if tan2 is None else tan2
+    bez = _estimateLengths(points, b, est1, est2)
+    if tan1 is None:
+        # Refine the start tangent from the least-squares position of the first
+        # handle, with the other control points fixed
+        b1 = b[:, 1]
+        den = b1 @ b1
+        if den != 0:
+            rest = b[:, [0, 2, 3]] @ bez[[0, 2, 3]]
+            d = (b1 @ (points - rest)) / den - bez[0]
+            if d[0] * d[0] + d[1] * d[1] > EPSILON:
+                bez = _estimateLengths(points, b, _unit(d), est2)
+    return bez
+
+
+def _reparameterize(
+    bez: np.ndarray, points: np.ndarray, u: np.ndarray, b: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Improve the parameters of the points by one Newton-Raphson step, so that they
+    are closer to the parameters of the nearest points on the curve. Parameters that
+    would move their point away from the curve are kept.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The new parameters, the Bernstein
+            polynomials at the new parameters, and the points on the curve.
+    """
+    q0 = b @ bez
+    d1 = 3 * (bez[1:] - bez[:-1])
+    d2 = 2 * (d1[1:] - d1[:-1])
+    mu = 1 - u
+    q1 = np.column_stack((mu * mu, 2 * u * mu, u * u)) @ d1
+    q2 = np.column_stack((mu, u)) @ d2
+    diff = q0 - points
+    numerator = (diff * q1).sum(axis=1)
+    denominator = (q1 * q1).sum(axis=1) + (diff * q2).sum(axis=1)
+    safe = np.where(denominator > 0, denominator, 1.0)
+    improved = np.where(denominator > 0, u - numerator / safe, u)
+    np.clip(improved, 0, 1, out=improved)
+
+    b_new = _bernstein(improved)
+    q_new = b_new @ bez
+    d_new = q_new - points
+    better = (d_new * d_new).sum(axis=1) <= (diff * diff).sum(axis=1)
+    if better.all():
+        return improved, b_new, q_new
+    better_ = better[:, None]
+    return (
+        np.where(better, improved, u),
+        np.where(better_, b_new, b),
+        np.where(better_, q_new, q0),
+    )
+
+
+def _computeMaxError(
+    bez: np.ndarray,
+    points: np.ndarray,
+    u: np.ndarray,
+    q: np.ndarray,
+    tolerance: float,
+    cornerTolerance: float,
+) -> Tuple[float, int]:
+    """Return the ratio of the maximum distance of the points from the curve to the
+    tolerance, and the index of the farthest point.
+
+    If the curve has a hook, i.e. it deviates more from the polyline through the
+    points than its distance error suggests, the negative ratio of the hook and the
+    index of the point before it are returned instead, so the caller can split the
+    points at a corner.
+    """
+    d = q - points
+    distances = np.einsum("ij,ij->i", d, d)
+    split = int(np.argmax(distances[1:])) + 1
+    dist_ratio = sqrt(distances[split]) / tolerance
+
+    # The deviation of the curve between two points from the straight line
+    mid = _bernstein(0.5 * (u[1:] + u[:-1])) @ bez
+    h = mid - 0.5 * (q[1:] + q[:-1])
+    hook = np.sqrt(np.einsum("ij,ij->i", h, h))
+    c = q[1:] - q[:-1]
+    allowed = np.sqrt(np.einsum("ij,ij->i", c, c)) + cornerTolerance
+    ratios = np.where(hook < cornerTolerance, 0.0, hook / allowed)
+    snap = int(np.argmax(ratios))
+    if ratios[snap] <= dist_ratio:
+        return dist_ratio, split
+    return -ratios[snap], snap
+
+
+def _centerTangent(points: np.ndarray, center: int) -> np.ndarray:
+    """Return the unit tangent at a point between two pieces, pointing backwards."""
+    d = points[center - 1] - points[center + 1]
+    if not d.any():
+        d = points[center] - points[center - 1]
+        d = np.array((-d[1], d[0]))
+    return _unit(d)
+
+
+def _fitPiece(
+    points: np.ndarray,
+    tan1: np.ndarray | None,
+    tan2: np.ndarray | None,
+    error: float,
+    cornerTolerance: float,
+    hopeless=3.0,
+) -> Tuple[np.ndarray, float, int]:
+    """Fit one cubic Bézier curve to the points. The fit is improved by
+    reparameterization unless its error ratio exceeds `hopeless`, in which case the
+    caller is expected to split the points instead.
+
+    Returns:
+        Tuple[np.ndarray, float, int]: The curve, and the error ratio and split index
+            as returned by `_computeMaxError`.
+    """
+    # Chord length parameterization
+    d = points[1:] - points[:-1]
+    u = np.empty(len(points))
+    u[0] = 0.0
+    np.cumsum(np.sqrt(np.einsum("ij,ij->i", d, d)), out=u[1:])
+    u /= u[-1]
+
+    b = _bernstein(u)
+    for i in range(MAX_ITERATIONS + 1):
+        bez = _generateBezier(points, b, tan1, tan2, error)
+        u, b, q = _reparameterize(bez, points, u, b)
+        ratio, split = _computeMaxError(bez, points, u, q, error, cornerTolerance)
+        if not 1 < ratio <= hopeless:
+            # The fit is good, or too bad to be improved by reparameterization
+            break
+    return bez, ratio, split
+
+
+def fitCubics(
+    points: Sequence[TPoint] | np.ndarray,
+    error=1.0,
+    cornerTolerance=1.0,
+    maxSegments=10000,
+) -> List[np.ndarray]:
+    """Fit a sequence of cubic Bézier curves to a sequence of points. Consecutive
+    curves join smoothly, except at detected corners.
+
+    Args:
+        points (Sequence[TPoint] | np.ndarray): The points.
+        error (float, optional): The maximum distance of the points from the fitted
+            curves. Defaults to 1.0.
+        cornerTolerance (float, optional): The tolerance for detecting corners. Where
+            a curve bulges out by more than this distance between two points, the
+            points are split at a corner. Defaults to 1.0.
+        maxSegments (int, optional): The maximum number of curves. When it is
+            reached, the remaining pieces are not split further. Defaults to 10000.
+
+    Returns:
+        List[np.ndarray]: The curves, each as an array of four control points.
+    """
+    p = np.asarray(points, dtype=float).reshape(-1, 2)
+    # Remove consecutive duplicates
+    p = p[np.concatenate(((True,), np.any(p[1:] != p[:-1], axis=1)))]
+    if len(p) < 2:
+        return []
+
+    curves: List[np.ndarray] = []
+    # The pieces to fit, as start and end index and tangents. The last item is fitted
+    # first, so the curves are produced in order.
+    stack: List[Tuple[int, int, np.ndarray | None, np.ndarray | None]] = [
+        (0, len(p) - 1, None, None)
+    ]
+    while stack:
+        start, end, tan1, tan2 = stack.pop()
+        pts = p[start : end + 1]
+        if len(pts) == 2:
+            curves.append(_fitLine(pts, tan1, tan2))
+            continue
+
+        bez, ratio, split = _fitPiece(pts, tan1, tan2, error, cornerTolerance)
+
+        budget_left = len(curves) + len(stack) + 1 < maxSegments
+        if abs(ratio) <= 1 or not budget_left:
+            curves.append(bez)
+            continue
+
+        if ratio < 0:
+            # Split at a corner, the tangents on both sides are independent
+            split = min(max(split, 1), len(pts) - 2)
+            split_tan1 = split_tan2 = None
+        else:
+            # Split smoothly, with opposite tangents on both sides
+            split_tan2 = _centerTangent(pts, split)
+            split_tan1 = -split_tan2
+        stack.append((start + split, end, split_tan1, tan2))
+        stack.append((start, start + split, tan1, split_tan2))
+
+    return curves
+
+
+def fitCubicsFixed(
+    points: Sequence[TPoint] | np.ndarray,
+    count: int,
+    error=1.0,
+    cornerTolerance=1.0,
+) -> List[np.ndarray]:
+    """Fit a fixed number of smoothly joined cubic Bézier curves to a sequence of
+    points. The points are split into pieces of the same number of points, so the
+    result has the same structure for all point sequences of the same length.
+
+    Args:
+        points (Sequence[TPoint] | np.ndarray): The points.
+        count (int): The number of curves. Fewer curves are returned if there are not
+            enough distinct points.
+        error (float, optional): The distance of the points from a curve that ends
+            the improvement of the curve by reparameterization. Defaults to 1.0.
+        cornerTolerance (float, optional): The tolerance for detecting corners, which
+            also end the improvement of a curve. Defaults to 1.0.
+
+    Returns:
+        List[np.ndarray]: The curves, each as an array of four control points.
+    """
+    p = np.asarray(points, dtype=float).reshape(-1, 2)
+    # Remove consecutive duplicates
+    p = p[np.concatenate(((True,), np.any(p[1:] != p[:-1], axis=1)))]
+    if len(p) < 2:
+        return []
+
+    splits = np.unique(np.linspace(0, len(p) - 1, count + 1).round().astype(int))
+    curves: List[np.ndarray] = []
+    tan1 = None
+    for start, end in zip(splits[:-1].tolist(), splits[1:].tolist()):
+        # Join the curves smoothly, with opposite tangents on both sides
+        tan2 = None if end == len(p) - 1 else _centerTangent(p, end)
+        pts = p[start : end + 1]
+        if len(pts) == 2:
+            curves.append(_fitLine(pts, tan1, tan2))
+        else:
+            # The piece can't be split, so always try to improve the fit
+            bez, _, _ = _fitPiece(pts, tan1, tan2, error, cornerTolerance, np.inf)
+            curves.append(bez)
+        tan1 = None if tan2 is None else -tan2
+    return curves
@@ -1,15 +1,247 @@
 from __future__ import annotations
 
-from beziers.path import BezierPath as SCBezierPath
-from beziers.point import Point as SCPoint
-from fontPens.penTools import getCubicPoint
-from fontTools.misc.bezierTools import calcCubicArcLength
+import numpy as np
+
 from functools import cached_property
-from math import atan2, sqrt
+from math import atan2, copysign, cos, sin, sqrt
+from nibLib.fitting import fitCubics, fitCubicsFixed
 from nibLib.typing import CCurve, TPoint
 from typing import List, Sequence, Tuple
 
 
+# Gauss-Legendre nodes and weights on the interval [0, 1], used to compute the arc
+# length of cubic curves
+_GAUSS_NODES, _GAUSS_WEIGHTS = np.polynomial.legendre.leggauss(16)
+_GAUSS_NODES = 0.5 * (_GAUSS_NODES + 1)
+_GAUSS_WEIGHTS = 0.5 * _GAUSS_WEIGHTS
+
+
+def _cubicDerivatives(c: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Return the first derivatives of cubic curves at the parameters t.
+
+    Args:
+        c (np.ndarray): The control points of the curves, shape (..., 4, 2).
+        t (np.ndarray): The parameters, shape (...).
+
+    Returns:
+        np.ndarray: The derivatives, shape (..., 2).
+    """
+    t = t[..., None]
+    mt = 1 - t
+    return 3 * (
+        mt * mt * (c[..., 1, :] - c[..., 0, :])
+        + 2 * mt * t * (c[..., 2, :] - c[..., 1, :])
+        + t * t * (c[..., 3, :] - c[..., 2, :])
+    )
+
+
+def _evaluateCubics(c: np.ndarray, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the points and tangent vectors of cubic curves at the parameters t.
+
+    Args:
+        c (np.ndarray): The control points of the curves, shape (N, 4, 2).
+        t (np.ndarray): The parameters, shape (N,).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The points and the tangent vectors, shape
+            (N, 2) each.
+    """
+    t_ = t[:, None]
+    mt = 1 - t_
+    points = (
+        mt * mt * mt * c[:, 0]
+        + 3 * mt * mt * t_ * c[:, 1]
+        + 3 * mt * t_ * t_ * c[:, 2]
+        + t_ * t_ * t_ * c[:, 3]
+    )
+    tangents = _cubicDerivatives(c, t)
+
+    # Where the derivative vanishes (e.g. when an off-curve point coincides with its
+    # on-curve point), use the direction of the second derivative, and as a last
+    # resort, the direction from the curve's start to end point.
+    degenerate = np.hypot(tangents[:, 0], tangents[:, 1]) < 1e-9
+    if degenerate.any():
+        cd = c[degenerate]
+        td = t_[degenerate]
+        second = 6 * (
+            (1 - td) * (cd[:, 2] - 2 * cd[:, 1] + cd[:, 0])
+            + td * (cd[:, 3] - 2 * cd[:, 2] + cd[:, 1])
+        )
+        second *= np.where(td < 0.5, 1.0, -1.0)
+        chord = cd[:, 3] - cd[:, 0]
+        small = np.hypot(second[:, 0], second[:, 1]) < 1e-9
+        second[small] = chord[small]
+        tangents[degenerate] = second
+
+    return points, tangents
+
+
+def getCurveLengths(curves: Sequence[CCurve] | np.ndarray) -> np.ndarray:
+    """Return the arc lengths of cubic curve segments.
+
+    Args:
+        curves (Sequence[CCurve] | np.ndarray): The cubic curve segments, as an array
+            of shape (N, 4, 2) or a sequence of four control points each.
+
+    Returns:
+        np.ndarray: The arc lengths, shape (N,).
+    """
+    c = np.asarray(curves, dtype=float).reshape(-1, 4, 2)
+    d = _cubicDerivatives(c[:, None], np.broadcast_to(_GAUSS_NODES, (len(c), 16)))
+    return np.hypot(d[..., 0], d[..., 1]) @ _GAUSS_WEIGHTS
+
+
+def getPointsFromCurves(
+    curves: Sequence[CCurve] | np.ndarray, div=0.75
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten cubic curve segments into points. The parameter step for each curve is
+    derived from its arc length, so that consecutive points are about `div` units
+    apart. All curves are evaluated in one batch.
+
+    Args:
+        curves (Sequence[CCurve] | np.ndarray): The cubic curve segments, as an array
+            of shape (N, 4, 2) or a sequence of four control points each.
+        div (float, optional): The dividend to be used to split the curves. Defaults to
+            0.75.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The points, shape (M, 2); the
+            tangent vectors at the points, shape (M, 2); and the offsets of the points
+            of each curve, shape (N + 1), i.e. the points of curve i are
+            `points[offsets[i]:offsets[i + 1]]`.
+    """
+    c = np.asarray(curves, dtype=float).reshape(-1, 4, 2)
+    lengths = getCurveLengths(c)
+
+    # Number of points per curve, including the end point
+    counts = np.maximum(np.ceil(lengths / div), 1).astype(int) + 1
+    offsets = np.zeros(len(c) + 1, dtype=int)
+    np.cumsum(counts, out=offsets[1:])
+
+    # The index of the curve for each point, and the parameter t of each point
+    index = np.repeat(np.arange(len(c)), counts)
+    k = np.arange(offsets[-1]) - offsets[index]
+    t = np.minimum(k * (div / np.maximum(lengths, div))[index], 1.0)
+    t[offsets[1:] - 1] = 1.0
+
+    points, tangents = _evaluateCubics(c[index], t)
+    return points, tangents, offsets
+
+
+def getAdaptivePointsFromCurves(
+    curves: Sequence[CCurve] | np.ndarray,
+    tolerance=0.25,
+    radius=0.0,
+    min_length=0.5,
+    resolution=32,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten cubic curve segments into points, with more points where the curves
+    turn faster and fewer points on flat stretches. All curves are processed in one
+    batch.
+
+    A piece of a curve with the chord length l that turns by the angle θ deviates
+    from its chord by about l·θ/8. The tangent angle also determines the support point
+    of the nib, so the points offset by a nib with the given `radius` move by up to
+    r·θ, and their polyline deviates by about (l + r·θ)·θ/8. Split into k parts, each
+    part deviates by 1/k² of that, so a curve needs about the integral of
+    sqrt((dl + r·dθ)·dθ/8) / sqrt(tolerance) points. This integral is measured on
+    `resolution` intervals per curve, and the points are distributed evenly over it.
+
+    Args:
+        curves (Sequence[CCurve] | np.ndarray): The cubic curve segments, as an array
+            of shape (N, 4, 2) or a sequence of four control points each.
+        tolerance (float, optional): The allowed deviation. Defaults to 0.25.
+        radius (float, optional): The radius of the nib, i.e. the maximum distance of
+            the support points from the curve. Defaults to 0.0.
+        min_length (float, optional): The minimum distance between points. Defaults to
+            0.5.
+        resolution (int, optional): The number of intervals per curve used to measure
+            the length and turning. Defaults to 32.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The points, shape (M, 2); the
+            tangent vectors at the points, shape (M, 2); and the offsets of the points
+            of each curve, shape (N + 1), as in `getPointsFromCurves`.
+    """
+    c = np.asarray(curves, dtype=float).reshape(-1, 4, 2)
+    n = len(c)
+
+    # Measure the length and turning of the curves on a fine grid
+    grid = np.linspace(0, 1, resolution + 1)
+    index = np.repeat(np.arange(n), resolution + 1)
+    points, tangents = _evaluateCubics(c[index], np.tile(grid, n))
+    points = points.reshape(n, resolution + 1, 2)
+    tangents = tangents.reshape(n, resolution + 1, 2)
+    d = np.diff(points, axis=1)
+    lengths = np.hypot(d[..., 0], d[..., 1])
+    t0 = tangents[:, :-1]
+    t1 = tangents[:, 1:]
+    turns = np.abs(
+        np.arctan2(
+            t0[..., 0] * t1[..., 1] - t0[..., 1] * t1[..., 0],
+            t0[..., 0] * t1[..., 0] + t0[..., 1] * t1[..., 1],
+        )
+    )
+    weights = np.sqrt((lengths + radius * turns) * turns / 8)
+
+    # The number of points per curve, including the end point
+    totals = weights.sum(axis=1)
+    counts = np.ceil(totals / sqrt(tolerance))
+    counts = np.minimum(counts, np.ceil(lengths.sum(axis=1) / min_length))
+    counts = np.maximum(counts, 1).astype(int) + 1
+    offsets = np.zeros(n + 1, dtype=int)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Distribute the points evenly over the cumulative weight of each curve. A small
+    # amount is added to each interval, so the cumulative weight is strictly
+    # increasing and straight curves are split evenly.
+    weights += 1e-9 * (totals[:, None] + 1)
+    cumulative = np.zeros((n, resolution + 1))
+    np.cumsum(weights, axis=1, out=cumulative[:, 1:])
+    index = np.repeat(np.arange(n), counts)
+    k = np.arange(offsets[-1]) - offsets[index]
+    targets = k / (counts - 1)[index] * cumulative[index, -1]
+    # Interpolate all curves at once, shifting each curve to its own range
+    shift = np.arange(n) * 2.0
+    scale = 1 / cumulative[:, -1]
+    t = np.interp(
+        targets * scale[index] + shift[index],
+        (cumulative * scale[:, None] + shift[:, None]).ravel(),
+        np.tile(grid, n),
+    )
+    t[offsets[:-1]] = 0.0
+    t[offsets[1:] - 1] = 1.0
+
+    points, tangents = _evaluateCubics(c[index], t)
+    return points, tangents, offsets
+
+
+def getUniformPointsFromCurves(
+    curves: Sequence[CCurve] | np.ndarray, count=16
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Flatten cubic curve segments into the same number of points each, at evenly
+    spaced parameters. Unlike the other sampling functions, the number of points
+    doesn't depend on the shape of the curves, so compatible curves give compatible
+    results.
+
+    Args:
+        curves (Sequence[CCurve] | np.ndarray): The cubic curve segments, as an array
+            of shape (N, 4, 2) or a sequence of four control points each.
+        count (int, optional): The number of points per curve, including the start and
+            end points. Defaults to 16.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The points, shape (M, 2); the
+            tangent vectors at the points, shape (M, 2); and the offsets of the points
+            of each curve, shape (N + 1), as in `getPointsFromCurves`.
+    """
+    c = np.asarray(curves, dtype=float).reshape(-1, 4, 2)
+    n = len(c)
+    index = np.repeat(np.arange(n), count)
+    points, tangents = _evaluateCubics(c[index], np.tile(np.linspace(0, 1, count), n))
+    return points, tangents, np.arange(n + 1) * count
+
+
 def getPointsFromCurve(p: CCurve, div=0.75) -> List[TPoint]:
     """Return a list of points for the given cubic curve segment.
 
@@ -20,47 +252,46 @@ def getPointsFromCurve(p: CCurve, div=0.75) -> List[TPoint]:
     Returns:
         List[TPoint]: The list of points.
     """
-    points = []
-    length = calcCubicArcLength(p[0], p[1], p[2], p[3])
-    t = 0
-    step = div / length
-    # print("Length:", d, "Steps:", step)
-    while t < 1:
-        points.append(getCubicPoint(t, p[0], p[1], p[2], p[3]))
-        t += step
-    points.append(p[3])
-    return points
+    points, _, _ = getPointsFromCurves([p], div)
+    return [(x, y) for x, y in points.tolist()]
 
 
-def getPathFromPoints(points: Sequence[TPoint]) -> List[Tuple[TPoint, ...]]:
+def getPathFromPoints(
+    points: Sequence[TPoint] | np.ndarray,
+    error=1.0,
+    cornerTolerance=1.0,
+    maxSegments=10000,
+    segments: int | None = None,
+) -> List[Tuple[TPoint, ...]]:
     """Return a path with lines and curves from a sequence of points.
 
     Args:
-        points (Sequence[TPoint]): The list of points.
+        points (Sequence[TPoint] | np.ndarray): The list of points.
+        error (float, optional): The maximum distance of the points from the fitted
+            curves. Defaults to 1.0.
+        cornerTolerance (float, optional): The tolerance for detecting corners, where
+            the path is split. Defaults to 1.0.
+        maxSegments (int, optional): The maximum number of curve segments. Defaults to
+            10000.
+        segments (int | None, optional): If given, fit exactly this number of smoothly
+            joined curve segments to pieces of the same number of points, regardless
+            of the error. Defaults to None.
 
     Returns:
         List[Tuple[TPoint, ...]]: The path.
     """
-    curve_points = SCBezierPath().fromPoints(
-        [SCPoint(x, y) for x, y in points],
-        error=1.0,
-        cornerTolerance=1.0,
-        maxSegments=10000,
-    )
+    if segments is None:
+        curves = fitCubics(points, error, cornerTolerance, maxSegments)
+    else:
+        curves = fitCubicsFixed(points, segments, error, cornerTolerance)
+    if not curves:
+        return []
 
-    # Reconvert Simon's BezierPath segments to our segment type
-    curves: List[Tuple[TPoint, ...]] = []
-    first = True
-    for segment in curve_points.asSegments():
-        if first:
-            # For the first segment, add the move point
-            p = segment[0]
-            curves.append(((p.x, p.y),))
-            first = False
-        # Do we have to check the length of the tuples? Or are they always cubic curves
-        # with 3 points?
-        curves.append(tuple([(p.x, p.y) for p in segment[1:]]))
-    return curves
+    # The first item is the move point, followed by one item per curve segment
+    path: List[Tuple[TPoint, ...]] = [(tuple(curves[0][0].tolist()),)]
+    for curve in curves:
+        path.append(tuple(map(tuple, curve[1:].tolist())))
+    return path
 
 
 def angleBetweenPoints(p0: TPoint, p1: TPoint) -> float:
@@ -114,6 +345,76 @@ def halfPoint(p0: TPoint, p1: TPoint, doRound=False) -> TPoint:
     return xh, yh
 
 
+def getSuperellipseTangentPoint(
+    a: float, b: float, superness: float, alpha: float
+) -> TPoint:
+    """Return the point on a superellipse |x/a|^n + |y/b|^n = 1 where the tangent has
+    the angle alpha, on the side that is left of the tangent direction. This is the
+    point of the superellipse that is farthest in the direction (-sin α, cos α).
+
+    Args:
+        a (float): The half width of the superellipse.
+        b (float): The half height of the superellipse.
+        superness (float): The exponent n. For n <= 1, the tangent point is a
+            vertex of the diamond with the same width and height.
+        alpha (float): The tangent angle in radians.
+
+    Returns:
+        TPoint: The tangent point.
+    """
+    # Maximize the dot product with the direction over the unit ball of the n-norm.
+    # The maximum is reached at |u_i| = |p_i|^(q - 1) / ||p||_q^(q - 1), where q is
+    # the conjugate exponent of n.
+    px = -a * sin(alpha)
+    py = b * cos(alpha)
+    if superness <= 1:
+        # A diamond, or a concave shape whose convex hull is a diamond. The farthest
+        # point is one of its vertices.
+        if abs(px) >= abs(py):
+            return copysign(a, px), 0.0
+        return 0.0, copysign(b, py)
+
+    q1 = 1 / (superness - 1)  # q - 1
+    # The result doesn't depend on the length of the direction. Scale it so that the
+    # powers don't overflow when n is close to 1.
+    m = max(abs(px), abs(py))
+    x = abs(px) / m
+    y = abs(py) / m
+    ux = x**q1
+    uy = y**q1
+    norm = (ux * x + uy * y) ** (q1 / (q1 + 1))
+    return copysign(a * ux / norm, px), copysign(b * uy / norm, py)
+
+
+def getSuperellipseTangentPoints(
+    a: float, b: float, superness: float, alphas: np.ndarray
+) -> np.ndarray:
+    """Return the tangent points of a superellipse for an array of tangent angles. See
+    `getSuperellipseTangentPoint`.
+
+    Args:
+        a (float): The half width of the superellipse.
+        b (float): The half height of the superellipse.
+        superness (float): The exponent n.
+        alphas (np.ndarray): The tangent angles in radians, shape (...).
+
+    Returns:
+        np.ndarray: The tangent points, shape (..., 2).
+    """
+    p = np.stack((-a * np.sin(alphas), b * np.cos(alphas)), axis=-1)
+    ap = np.abs(p)
+    if superness <= 1:
+        # The farthest point is a vertex of the diamond
+        x_axis = ap[..., 0] >= ap[..., 1]
+        return np.copysign(np.stack((x_axis, ~x_axis), axis=-1), p) * (a, b)
+
+    q1 = 1 / (superness - 1)
+    ap /= ap.max(axis=-1, keepdims=True)
+    u = ap**q1
+    norm = np.sum(u * ap, axis=-1, keepdims=True) ** (q1 / (q1 + 1))
+    return np.copysign(u / norm, p) * (a, b)
+
+
 class Triangle(object):
     """
     A triangle with points A, B, C; sides a, b, c; angles α, β, γ.
@@ -164,31 +465,96 @@ class Triangle(object):
         return h
 
 
-def optimizePointPath(p: Sequence[TPoint], dist=0.49) -> List[TPoint]:
-    """Return an optimized version of a list of points. A points will be skipped unless
-    its distance from the line formed by its previous to its next point is greater than
-    `dist`.
+def _rdpMask(points: np.ndarray, dist: float) -> np.ndarray:
+    """Return a mask of the points to keep after a Ramer-Douglas-Peucker
+    simplification of a polyline.
+
+    Args:
+        points (np.ndarray): The points, shape (N, 2).
+        dist (float): The maximum distance of a removed point from the simplified
+            polyline.
+
+    Returns:
+        np.ndarray: The boolean mask, shape (N,).
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+
+        # Distances of the points between i and j from the segment i -> j
+        a = points[i]
+        d = points[j] - a
+        v = points[i + 1 : j] - a
+        dd = d @ d
+        if dd > 0:
+            t = np.clip((v @ d) / dd, 0, 1)
+            v = v - t[:, None] * d
+        distances = np.hypot(v[:, 0], v[:, 1])
+
+        k = int(np.argmax(distances))
+        if distances[k] > dist:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return keep
+
+
+def optimizePointPath(
+    p: Sequence[TPoint] | np.ndarray, dist=0.49, rdp=False
+) -> List[TPoint]:
+    """Return an optimized version of a list of points. A point will be skipped unless
+    the distance of the reference point from the line formed by the point and its next
+    point is greater than `dist`. The reference point is the first point, and after a
+    point has been kept, the point before it.
+
+    In RDP mode, the Ramer-Douglas-Peucker algorithm is used instead. It is slower, but
+    guarantees that no skipped point is farther than `dist` from the optimized path.
 
     Args:
-        p (Sequence[TPoint]): The path as a sequence of points.
+        p (Sequence[TPoint] | np.ndarray): The path as a sequence of points.
         dist (float, optional): The maximum distance. Defaults to 0.49.
+        rdp (bool, optional): Whether to use the Ramer-Douglas-Peucker algorithm.
+            Defaults to False.
 
     Returns:
         Sequence[TPoint]: The optimized sequence of points.
     """
+    if isinstance(p, np.ndarray):
+        p = list(map(tuple, p.tolist()))
+
     num_points = len(p)
-    p0 = p[0]
-    optimized = [p0]  # Keep the first point of the original path
-    i = 0
-    while i < num_points - 2:
-        p1 = p[i + 1]
-        p2 = p[i + 2]
-        t = Triangle(p0, p2, p1)
-        if t.height_a > dist:
-            optimized.append(p1)
-            p0 = p[i]
+    if num_points < 3:
+        return list(p)
+
+    if rdp:
+        keep = _rdpMask(np.asarray(p, dtype=float), dist)
+        return [pt for pt, k in zip(p, keep.tolist()) if k]
+
+    x0, y0 = p[0]
+    optimized = [p[0]]  # Keep the first point of the original path
+    dist2 = dist * dist
+    for i in range(num_points - 2):
+        x1, y1 = p[i + 1]
+        x2, y2 = p[i + 2]
+        # The squared distance of the reference point from the line through points
+        # i + 1 and i + 2, from the cross product
+        dx = x2 - x1
+        dy = y2 - y1
+        cross = dx * (y0 - y1) - dy * (x0 - x1)
+        d2 = dx * dx + dy * dy
+        if d2 == 0:
+            # The line is degenerate, use the distance between the points
+            keep = (x0 - x1) ** 2 + (y0 - y1) ** 2 > dist2
         else:
-            pass
-        i += 1
+            keep = cross * cross > dist2 * d2
+        if keep:
+            optimized.append(p[i + 1])
+            x0, y0 = p[i]
     optimized.append(p[-1])  # Keep the last point of the original path
     return optimized
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import numpy as np
+
 from fontTools.misc.bezierTools import (
     calcCubicParameters,
     solveQuadratic,
@@ -64,6 +66,93 @@ def split_at_extrema(
     return splitCubicAtT(t1, t2, t3, t4, *roots)
 
 
+def _solve_quadratics(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """Solve the quadratic equations a·t² + b·t + c = 0 in the same way as
+    `fontTools.misc.bezierTools.solveQuadratic`.
+
+    Returns:
+        np.ndarray: The two roots of each equation, in a new last axis. Missing roots
+            are NaN.
+    """
+    linear = np.abs(a) < epsilon
+    dd = b * b - 4.0 * a * c
+    quadratic = ~linear & (dd >= 0.0)
+    r = np.sqrt(np.where(quadratic, dd, np.nan))
+    r1 = (-b + r) / 2.0 / a
+    r2 = (-b - r) / 2.0 / a
+    r1 = np.where(linear & (np.abs(b) >= epsilon), -c / b, r1)
+    return np.stack((r1, r2), axis=-1)
+
+
+def split_at_extrema_batch(curves: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split many cubic curves at their horizontal and vertical extrema at once. This is
+    the batched version of `split_at_extrema`, with the same results. To split at the
+    extrema at a nib angle, rotate the curves by the negative nib angle first.
+
+    Args:
+        curves (np.ndarray): The curves, shape (N, 4, 2).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The split curves, shape (M, 4, 2), and the
+            offsets of the pieces of each input curve, shape (N + 1), so the pieces of
+            curve i are at `offsets[i]:offsets[i + 1]`.
+    """
+    curves = np.asarray(curves, dtype=float).reshape(-1, 4, 2)
+    p1, p2, p3, p4 = curves[:, 0], curves[:, 1], curves[:, 2], curves[:, 3]
+
+    # The parameters as in calcCubicParameters
+    c = (p2 - p1) * 3.0
+    b = (p3 - p2) * 3.0 - c
+    a = p4 - p1 - c - b
+    d = p1
+
+    # The roots of the derivative in x and y, inside the curve, unique and sorted
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roots = _solve_quadratics(a * 3.0, b * 2.0, c).reshape(-1, 4)
+    roots[~((roots > 0) & (roots < 1))] = np.nan
+    roots.sort(axis=1)
+    duplicate = roots[:, 1:] == roots[:, :-1]
+    roots[:, 1:][duplicate] = np.nan
+    roots.sort(axis=1)
+
+    counts = np.count_nonzero(~np.isnan(roots), axis=1) + 1
+    offsets = np.zeros(len(curves) + 1, dtype=int)
+    np.cumsum(counts, out=offsets[1:])
+
+    # The parameter interval of each piece
+    bounds = np.ones((len(curves), 6))
+    bounds[:, 0] = 0.0
+    bounds[:, 1:5] = np.where(np.isnan(roots), 1.0, roots)
+    starts = bounds[:, :-1]
+    valid = starts < 1.0
+    index = np.nonzero(valid)[0]
+    t1 = starts[valid][:, None]
+    delta = bounds[:, 1:][valid][:, None] - t1
+
+    # The pieces as in _splitCubicAtT and calcCubicPoints
+    a, b, c, d = a[index], b[index], c[index], d[index]
+    delta_2 = delta * delta
+    delta_3 = delta * delta_2
+    t1_2 = t1 * t1
+    t1_3 = t1 * t1_2
+    a1 = a * delta_3
+    b1 = (3 * a * t1 + b) * delta_2
+    c1 = (2 * b * t1 + c + 3 * a * t1_2) * delta
+    d1 = a * t1_3 + b * t1_2 + c * t1 + d
+    q2 = (c1 / 3.0) + d1
+    q3 = (b1 + c1) / 3.0 + q2
+    q4 = a1 + d1 + c1 + b1
+    pieces = np.stack((d1, q2, q3, q4), axis=1)
+
+    # Unsplit curves are kept as they are, and the last pieces end at the original
+    # end points
+    single = counts == 1
+    pieces[offsets[:-1][single]] = curves[single]
+    pieces[offsets[1:] - 1, 3] = p4
+    return pieces, offsets
+
+
 if __name__ == "__main__":
     import sys
     import doctest
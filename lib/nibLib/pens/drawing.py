@@ -1,8 +1,10 @@
-from AppKit import NSBezierPath, NSColor
-
+from __future__ import annotations
 
+from fontTools.pens.areaPen import AreaPen
+from fontTools.pens.reverseContourPen import ReverseContourPen
+from fontTools.pens.roundingPen import RoundingPen
 from nibLib.typing import TPoint
-from typing import Sequence
+from typing import Callable, List, Sequence, Tuple
 
 
 def draw_path(path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
@@ -10,6 +12,8 @@ def draw_path(path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
     Build a NSBezierPath from `path`. The NSBezierPath is then drawn in the current
     context.
     """
+    # AppKit is imported here so the pens can be used where it is not available
+    from AppKit import NSBezierPath, NSColor
 
     if not path:
         return
@@ -29,3 +33,146 @@ def draw_path(path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
     subpath.closePath()
     NSColor.colorWithCalibratedRed_green_blue_alpha_(0, 0.2, 1, 0.5).set()
     subpath.stroke()
+
+
+def draw_path_with_pen(
+    path: Sequence[Sequence[TPoint]] | None,
+    pen,
+    round_pt: Callable[[TPoint], TPoint] | None = None,
+) -> None:
+    """Draw `path` as a closed contour into a fontTools segment pen.
+
+    Args:
+        path (Sequence[Sequence[TPoint]] | None): The path.
+        pen (AbstractPen): The pen.
+        round_pt (Callable[[TPoint], TPoint] | None, optional): A function that is
+            applied to each point before it is drawn. Defaults to None.
+    """
+    if not path:
+        return
+
+    if round_pt is None:
+        pts = path
+    else:
+        pts = [[round_pt(pt) for pt in segment] for segment in path]
+
+    pen.moveTo(pts[0][0])
+    for segment in pts[1:]:
+        if len(segment) == 1:
+            pen.lineTo(segment[0])
+        elif len(segment) == 3:
+            pen.curveTo(*segment)
+        else:
+            print("Unknown segment type:", segment)
+    pen.closePath()
+
+
+def draw_union_with_pen(
+    paths: Sequence[Sequence[Sequence[TPoint]] | None],
+    pen,
+    round_coords=False,
+    correct_direction=False,
+) -> None:
+    """Draw the union of closed paths into a fontTools segment pen. All paths are
+    combined in one boolean operation. This needs the package `skia-pathops`.
+
+    Args:
+        paths (Sequence[Sequence[Sequence[TPoint]] | None]): The paths.
+        pen (AbstractPen): The pen.
+        round_coords (bool, optional): Whether the coordinates of the result should be
+            rounded. Defaults to False.
+        correct_direction (bool, optional): Whether the contours of the result should
+            have the PostScript direction, i.e. outer contours counter-clockwise.
+            Otherwise, the direction is undefined. Defaults to False.
+    """
+    # pathops is imported here because it is an optional dependency
+    from pathops import Path
+
+    union = Path()
+    union_pen = union.getPen()
+    for path in paths:
+        if not path:
+            continue
+        # The paths can have either direction. Make them all counter-clockwise, so
+        # that overlapping paths don't cancel each other out.
+        area = AreaPen()
+        draw_path_with_pen(path, area)
+        draw_path_with_pen(
+            path, union_pen if area.value >= 0 else ReverseContourPen(union_pen)
+        )
+
+    union.simplify(fix_winding=correct_direction, keep_starting_points=True)
+    union.draw(RoundingPen(pen, roundFunc=round) if round_coords else pen)
+
+
+class RenderSink:
+    """
+    The base class for render sinks. A render sink receives the paths that a nib pen
+    produces in preview mode.
+    """
+
+    def draw_path(self, path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
+        """Render a closed path.
+
+        Args:
+            path (Sequence[Sequence[TPoint]] | None): The path. The first item contains
+                the start point, the following items contain one point for a line or
+                three points for a cubic curve segment.
+            width (float, optional): The line width. Defaults to 1.0.
+        """
+        raise NotImplementedError
+
+
+class AppKitSink(RenderSink):
+    """
+    Render into the current AppKit graphics context. This is used for the preview in
+    the font editors.
+    """
+
+    def draw_path(self, path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
+        draw_path(path, width)
+
+
+class NullSink(RenderSink):
+    """
+    Discard all paths.
+    """
+
+    def draw_path(self, path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
+        pass
+
+
+class RecordingSink(RenderSink):
+    """
+    Record all paths, so they can be replayed into another sink later.
+    """
+
+    def __init__(self) -> None:
+        self.paths: List[Tuple[Sequence[Sequence[TPoint]], float]] = []
+
+    def draw_path(self, path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
+        if path:
+            self.paths.append((path, width))
+
+    def replay(self, sink: RenderSink, width: float | None = None) -> None:
+        """Replay the recorded paths into another sink.
+
+        Args:
+            sink (RenderSink): The sink.
+            width (float | None, optional): The line width, overrides the recorded line
+                widths. Defaults to None.
+        """
+        for path, path_width in self.paths:
+            sink.draw_path(path, path_width if width is None else width)
+
+
+class PenSink(RenderSink):
+    """
+    Draw all paths into a fontTools segment pen.
+    """
+
+    def __init__(self, pen) -> None:
+        self.pen = pen
+
+    def draw_path(self, path: Sequence[Sequence[TPoint]] | None, width=1.0) -> None:
+        draw_path_with_pen(path, self.pen)
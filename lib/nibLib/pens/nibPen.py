@@ -2,10 +2,154 @@ from __future__ import annotations
 
 from fontTools.misc.transform import Transform
 from fontTools.pens.basePen import BasePen
-from math import pi
-from nibLib.pens.drawing import draw_path
+from fontTools.pens.pointPen import SegmentToPointPen
+from fontTools.pens.recordingPen import RecordingPen
+from functools import wraps
+from math import floor, log2, pi
+from nibLib.cache import StrokeCache, record_drawing, resolved_drawing_key
+from nibLib.pens.drawing import (
+    AppKitSink,
+    RenderSink,
+    draw_union_with_pen,
+)
+from nibLib.pens.profiling import NO_STAGE, NibProfiler
+from nibLib.pens.strokePath import (
+    StrokePath,
+    draw_contour,
+    flatten_path,
+    nest_path,
+)
 from nibLib.typing import TPoint
-from typing import Sequence
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Hashable,
+    List,
+    Sequence,
+    Tuple,
+)
+
+
+# The allowed deviation of the sampled curves from the exact stroke, in font units
+SAMPLING_TOLERANCE = 0.25
+
+# The maximum level of detail reduction for zoomed out previews
+MAX_DETAIL_LEVEL = 6
+
+
+def get_detail_level(scale: float) -> int:
+    """Return the level of detail for a preview at a view scale. At level n, the
+    tolerances of the preview are 2 ** n times those at 100 % zoom. 2 ** n is at most
+    1 / scale, so the deviation from the exact stroke in screen pixels is never greater
+    than at 100 % zoom.
+
+    Args:
+        scale (float): The view scale in pixels per font unit.
+
+    Returns:
+        int: The level of detail, from 0 to `MAX_DETAIL_LEVEL`.
+    """
+    if scale >= 1:
+        return 0
+    if scale <= 0:
+        return MAX_DETAIL_LEVEL
+    return min(MAX_DETAIL_LEVEL, floor(log2(1 / scale)))
+
+
+class SegmentCache:
+    """
+    A cache of the stroke pieces that a nib pen produced for each input segment. It
+    keeps the entries of the current and of the previous drawing pass, so when the pen
+    draws an edited version of the previous glyph, only the changed segments need to be
+    stroked again. Entries that were not used in a pass are discarded after the next
+    pass.
+    """
+
+    def __init__(self) -> None:
+        self._current: Dict[Hashable, Any] = {}
+        self._previous: Dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._current.keys() | self._previous.keys())
+
+    def lookup(self, key: Hashable) -> Any:
+        """Return the cached result for a segment key, or None."""
+        result = self._current.get(key)
+        if result is None:
+            result = self._previous.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._current[key] = result
+        self.hits += 1
+        return result
+
+    def store(self, key: Hashable, result: Any) -> None:
+        """Store the result for a segment key."""
+        self._current[key] = result
+
+    def new_pass(self) -> None:
+        """Start a new drawing pass."""
+        if self._current:
+            self._previous = self._current
+            self._current = {}
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self._current = {}
+        self._previous = {}
+
+
+def memoized_segment(method: Callable) -> Callable:
+    """
+    Decorate a segment method of a nib pen (e.g. `_lineTo` or `_curveToOne`), so the
+    stroke pieces it produces are looked up in the pen's segment cache. The key is made
+    from the method, the current point, the segment's points and the nib state. The
+    wall time of the method is recorded as a stage of the pen's profiler.
+    """
+
+    stage = method.__name__.lstrip("_")
+
+    @wraps(method)
+    def wrapper(self, *args) -> None:
+        with self._stage(stage):
+            _call_memoized(method, self, args)
+
+    return wrapper
+
+
+def _call_memoized(method: Callable, self: NibPen, args: Tuple[Any, ...]) -> None:
+    cache = self.segment_cache
+    if cache is None or self._currentPoint is None:
+        method(self, *args)
+        return
+
+    key = (
+        method.__qualname__,
+        tuple(self._currentPoint),
+        tuple(tuple(pt) for pt in args),
+        self.nib_state,
+    )
+    result = cache.lookup(key)
+    if result is not None:
+        self._count("segment_cache_hits")
+        paths, current_point = result
+        for points, types in paths:
+            self._emit(points, types)
+        self._currentPoint = current_point
+        return
+
+    paths: List[Tuple[Sequence[TPoint], Sequence[int]]] = []
+    self._segment_recordings.append(paths)
+    try:
+        method(self, *args)
+    finally:
+        self._segment_recordings.pop()
+    cache.store(key, (paths, self._currentPoint))
 
 
 class NibPen(BasePen):
@@ -19,6 +163,12 @@ class NibPen(BasePen):
         nib_superness=2.5,
         trace=False,
         round_coords=False,
+        sink: RenderSink | None = None,
+        segment_cache: SegmentCache | None = None,
+        profiler: NibProfiler | None = None,
+        out_pen=None,
+        compatible=False,
+        component_cache: StrokeCache | None = None,
     ):
         """The base class for all nib pens.
 
@@ -31,9 +181,87 @@ class NibPen(BasePen):
             nib_superness (float, optional): The superness of the nib shape. Only used in superelliptical nibs. Defaults to 2.5.
             trace (bool, optional): Whether the path should be traced. Defaults to False.
             round_coords (bool, optional): Whether the coordinates of the resulting path should be rounded. Defaults to False.
+            sink (RenderSink | None, optional): The sink that receives the paths in preview mode. Defaults to None, i.e. drawing into the current AppKit graphics context.
+            segment_cache (SegmentCache | None, optional): A cache for the stroke pieces of each segment. When the pen is reused for an edited glyph, only the changed segments are stroked again. Defaults to None.
+            profiler (NibProfiler | None, optional): A profiler that records the time per stage and counters. Defaults to None.
+            out_pen (AbstractPen | AbstractPointPen | None, optional): In trace mode, a segment or point pen that receives each contour as soon as it is produced, instead of collecting the contours in `path`. Defaults to None.
+            compatible (bool, optional): Whether curves should be sampled and fitted with a fixed number of points and segments, independent of the nib size and the curve shape, so the traced outlines of several masters are compatible. Defaults to False.
+            component_cache (StrokeCache | None, optional): A cache for the strokes of component base glyphs. Pass the same cache to several pens to reuse the strokes across glyphs. Defaults to None, i.e. a new cache for this pen.
         """
         BasePen.__init__(self, glyphSet)
 
+        self.profiler = profiler
+
+        self.set_angle(angle)
+        self.set_size(width, height)
+
+        # Used for drawing
+        self.color = show_nib_faces
+        self.highlight_nib_faces = False
+        self._scale = 1.0
+        # Coarser tolerances for zoomed out previews, see get_detail_level
+        self.detail_level = 0
+        self.sink = AppKitSink() if sink is None else sink
+
+        # Used for superelliptical nibs
+        self.nib_superness = nib_superness
+
+        # The tolerance for the adaptive sampling of curves
+        self.sampling_tolerance = SAMPLING_TOLERANCE
+
+        # Use the same point structure for all nib sizes, for interpolation
+        self.compatible = compatible
+
+        # Whether to trace the path; otherwise it is just drawn for preview
+        self.trace = trace
+
+        # Should the coordinates of the nib path be rounded?
+        self.round_coords = round_coords
+
+        # Stream the traced contours to a pen
+        self.out_pen = out_pen
+
+        # Memoize the stroke pieces per segment
+        self.segment_cache = segment_cache
+        self._segment_recordings: List[
+            List[Tuple[Sequence[TPoint], Sequence[int]]]
+        ] = []
+
+        # Memoize the strokes of component base glyphs per nib setting
+        self.component_cache = (
+            StrokeCache() if component_cache is None else component_cache
+        )
+        # While a base glyph is stroked, its paths are collected here instead of being
+        # output
+        self._component_paths: List[Tuple[Sequence[TPoint], Sequence[int]]] | None = (
+            None
+        )
+
+        # Initialize the nib face path
+        # This is only needed for more complex shapes
+        self.setup_nib()
+
+        self.reset()
+
+    @property
+    def out_pen(self):
+        """The pen that receives the traced contours as they are produced, or None."""
+        return self._out_pen_given
+
+    @out_pen.setter
+    def out_pen(self, pen) -> None:
+        self._out_pen_given = pen
+        if pen is not None and hasattr(pen, "addPoint"):
+            # Point pens receive the contours through a converter
+            pen = SegmentToPointPen(pen)
+        self._out_segment_pen = pen
+
+    def set_angle(self, angle: float) -> None:
+        """Set the nib angle and the transforms that depend on it.
+
+        Args:
+            angle (float): The nib's angle over the horizontal in radians.
+        """
         # Reduce the angle if it is greater than 180° or smaller than -180°
         self.angle = angle
         if self.angle > pi:
@@ -45,6 +273,13 @@ class NibPen(BasePen):
         self.transform = Transform().rotate(-self.angle)
         self.transform_reverse = Transform().rotate(self.angle)
 
+    def set_size(self, width: float, height: float) -> None:
+        """Set the nib width and height.
+
+        Args:
+            width (float): The width of the nib.
+            height (float): The height of the nib.
+        """
         self.width = width
         self.height = height
 
@@ -52,27 +287,111 @@ class NibPen(BasePen):
         self.a = 0.5 * width
         self.b = 0.5 * height
 
-        # Used for drawing
-        self.color = show_nib_faces
-        self.highlight_nib_faces = False
-        self._scale = 1.0
+    def reset(self) -> None:
+        """
+        Clear the state of the current glyph, so the pen can be used for another glyph.
+        The nib settings are kept.
+        """
+        self.path = StrokePath()
+        self._currentPoint: TPoint | None = None
+        if self.segment_cache is not None:
+            self.segment_cache.new_pass()
 
-        # Used for superelliptical nibs
-        self.nib_superness = nib_superness
+    def configure(
+        self,
+        angle: float | None = None,
+        width: float | None = None,
+        height: float | None = None,
+        show_nib_faces: bool | None = None,
+        nib_superness: float | None = None,
+        scale: float | None = None,
+    ) -> None:
+        """Change the nib settings and reset the pen. Only what depends on the changed
+        settings is recomputed. Arguments that are None are left unchanged.
 
-        # Whether to trace the path; otherwise it is just drawn for preview
-        self.trace = trace
+        Args:
+            angle (float | None, optional): The nib's angle over the horizontal in radians. Defaults to None.
+            width (float | None, optional): The width of the nib. Defaults to None.
+            height (float | None, optional): The height of the nib. Defaults to None.
+            show_nib_faces (bool | None, optional): Whether the nib face should be drawn separately. Defaults to None.
+            nib_superness (float | None, optional): The superness of the nib shape. Defaults to None.
+            scale (float | None, optional): The view scale of the preview, see `set_scale`. Defaults to None.
+        """
+        if scale is not None:
+            self.set_scale(scale)
 
-        # Should the coordinates of the nib path be rounded?
-        self.round_coords = round_coords
+        if angle is not None and angle != self.angle:
+            self.set_angle(angle)
 
-        # Initialize the nib face path
-        # This is only needed for more complex shapes
-        self.setup_nib()
+        nib_changed = False
+        if (width is not None and width != self.width) or (
+            height is not None and height != self.height
+        ):
+            self.set_size(
+                self.width if width is None else width,
+                self.height if height is None else height,
+            )
+            nib_changed = True
 
-        self.path = []
+        if nib_superness is not None and nib_superness != self.nib_superness:
+            self.nib_superness = nib_superness
+            nib_changed = True
 
-        self._currentPoint: TPoint | None = None
+        if nib_changed:
+            self.setup_nib()
+
+        if show_nib_faces is not None:
+            self.color = show_nib_faces
+
+        self.reset()
+
+    def set_scale(self, scale: float) -> None:
+        """Set the view scale of the preview. When the view is zoomed out, curves are
+        sampled with fewer points, and the nib faces are drawn with fewer points, so the
+        preview looks the same at screen resolution. Traces are not affected.
+
+        Args:
+            scale (float): The view scale in pixels per font unit.
+        """
+        self._scale = scale
+        detail_level = 0 if self.trace else get_detail_level(scale)
+        if detail_level != self.detail_level:
+            self.detail_level = detail_level
+            self.setup_nib()
+
+    def _preview_tolerance(self, tolerance: float) -> float:
+        # Return a tolerance for the current level of detail
+        return tolerance * (1 << self.detail_level)
+
+    @property
+    def nib_state(self) -> Hashable:
+        """
+        Return the settings that affect the stroke pieces, used as part of the keys for
+        the segment cache.
+        """
+        return (
+            type(self),
+            self.angle,
+            self.width,
+            self.height,
+            self.nib_superness,
+            self.sampling_tolerance,
+            self.detail_level,
+            self.compatible,
+            self.color,
+            self.trace,
+        )
+
+    def _stage(self, name: str) -> ContextManager[None]:
+        # Return a context manager that measures a stage if the pen has a profiler
+        if self.profiler is None:
+            return NO_STAGE
+        return self.profiler.stage(name)
+
+    def _count(self, name: str, n=1) -> None:
+        # Increase a counter if the pen has a profiler
+        if self.profiler is not None:
+            self.profiler.count(name, n)
 
     def round_pt(self, pt: TPoint) -> TPoint:
         # Round a point based on self.round_coords
@@ -85,13 +404,71 @@ class NibPen(BasePen):
         pass
 
     def addComponent(self, baseName: str, transformation: Transform) -> None:
-        """Components are ignored.
+        """Stroke a component. The stroke of the base glyph is cached for each nib
+        setting and moved to the offset of the component. As the nib angle stays the
+        same, scaled, slanted or rotated components can't reuse the stroke, their
+        transformed outline is stroked instead. See `_get_component_offset` for pens
+        whose output is transformed. Components are ignored if the pen has
+        no glyph set.
 
         Args:
             baseName (str): The base glyph name of the component.
             transformation (Transform): The component's transformation.
         """
-        pass
+        if self.glyphSet is None:
+            return
+
+        try:
+            base = self.glyphSet[baseName]
+        except KeyError:
+            return
+
+        xx, xy, yx, yy, dx, dy = transformation
+        if (xx, xy, yx, yy) != (1, 0, 0, 1):
+            BasePen.addComponent(self, baseName, transformation)
+            return
+
+        recording = record_drawing(base)
+        # The key contains the drawings of nested base glyphs as well, as they may
+        # differ between fonts that share the cache
+        key = (resolved_drawing_key(recording, self._record_base), self.nib_state)
+        paths = self.component_cache.get(key)
+        if paths is None:
+            paths = []
+            outer_paths = self._component_paths
+            self._component_paths = paths
+            try:
+                with self._stage("component"):
+                    recording.replay(self)
+            finally:
+                self._component_paths = outer_paths
+            self.component_cache.set(key, paths)
+        else:
+            self._count("component_cache_hits")
+
+        dx, dy = self._get_component_offset(dx, dy)
+        for points, types in paths:
+            self._emit([(x + dx, y + dy) for x, y in points], types)
+
+    def _get_component_offset(self, dx: float, dy: float) -> TPoint:
+        """Return the offset of the output paths for an offset of the guide drawing,
+        used to move the cached strokes of components.
+
+        Args:
+            dx (float): The horizontal offset of the guide drawing.
+            dy (float): The vertical offset of the guide drawing.
+
+        Returns:
+            TPoint: The offset of the output paths.
+        """
+        return dx, dy
+
+    def _record_base(self, name: str) -> RecordingPen | None:
+        # Record a base glyph from the glyph set, or return None if it is missing
+        try:
+            return record_drawing(self.glyphSet[name])
+        except KeyError:
+            return None
 
     def addPath(self, path: Sequence[Sequence[TPoint]] | None = None) -> None:
         """
@@ -100,11 +477,8 @@ class NibPen(BasePen):
         if path is None:
             return
 
-        tr_path = [self.transform_reverse.transformPoints(pts) for pts in path]
-        if self.trace:
-            self.path.append(tr_path)
-        else:
-            draw_path(tr_path, width=1 / self._scale)
+        points, types = flatten_path(path)
+        self._emit(self.transform_reverse.transformPoints(points), types)
 
     def addPathRaw(self, path: Sequence[Sequence[TPoint]] | None = None) -> None:
         """
@@ -114,41 +488,73 @@ class NibPen(BasePen):
         if path is None:
             return
 
+        self._emit(*flatten_path(path))
+
+    def _emit(self, points: Sequence[TPoint], types: Sequence[int]) -> None:
+        # Output a finished path, either to the traced path or to the sink. The path is
+        # given as flat points and the number of points of each segment.
+        for recording in self._segment_recordings:
+            recording.append((points, types))
+        if self._component_paths is not None:
+            self._component_paths.append((points, types))
+            return
+        if self.profiler is not None:
+            self.profiler.count("paths")
+            self.profiler.count("segments", len(types))
+            self.profiler.count("points", len(points))
         if self.trace:
-            self.path.append(path)
+            if self._out_segment_pen is None:
+                self.path.add_contour(points, types)
+            else:
+                with self._stage("output"):
+                    if self.round_coords:
+                        points = [self.round_pt(pt) for pt in points]
+                    draw_contour(self._out_segment_pen, points, types)
         else:
-            draw_path(path, width=1 / self._scale)
+            with self._stage("drawing"):
+                self.sink.draw_path(nest_path(points, types), width=1 / self._scale)
 
-    def trace_path(self, out_glyph, clear=True) -> None:
+    def trace_path(
+        self, out_glyph, clear=True, remove_overlap=False, correct_direction=False
+    ) -> None:
         """Trace the path into the supplied glyph.
 
         Args:
             out_glyph (RGlyph): The glyph to receive the traced path.
+            clear (bool, optional): Whether to clear the glyph first. Defaults to True.
+            remove_overlap (bool, optional): Whether to combine the stroke pieces into
+                one outline. Needs `skia-pathops`. Defaults to False.
+            correct_direction (bool, optional): Whether to correct the contour
+                direction when removing overlaps. Defaults to False.
         """
         if clear:
             out_glyph.clear()
-        p = out_glyph.getPen()
-        first = True
-        for path in self.path:
-            if first:
-                first = False
-            else:
-                p.closePath()
-            p.moveTo(self.round_pt(path[0][0]))
-            for segment in path[1:]:
-                if len(segment) == 1:
-                    p.lineTo(self.round_pt(segment[0]))
-                elif len(segment) == 3:
-                    p.curveTo(
-                        self.round_pt(segment[0]),
-                        self.round_pt(segment[1]),
-                        self.round_pt(segment[2]),
-                    )
-
-                else:
-                    print("Unknown segment type:", segment)
-        p.closePath()
-        # tmp.correctDirection()
-        # out_glyph.removeOverlap()
-        # out_glyph.removeOverlap()
-        # out_glyph.update()
+        self.draw_traced(
+            out_glyph.getPen(),
+            remove_overlap=remove_overlap,
+            correct_direction=correct_direction,
+        )
+
+    def draw_traced(self, pen, remove_overlap=False, correct_direction=False) -> None:
+        """Draw the traced path into a segment pen.
+
+        Args:
+            pen (AbstractPen): The pen to receive the traced path.
+            remove_overlap (bool, optional): Whether to combine the stroke pieces into
+                one outline, in a single boolean union of all pieces. Needs
+                `skia-pathops`. Defaults to False.
+            correct_direction (bool, optional): Whether the contours of the combined
+                outline should have the PostScript direction. Only used when removing
+                overlaps. Defaults to False.
+        """
+        if remove_overlap:
+            with self._stage("remove_overlap"):
+                draw_union_with_pen(
+                    self.path,
+                    pen,
+                    round_coords=self.round_coords,
+                    correct_direction=correct_direction,
+                )
+            return
+
+        self.path.draw(pen, self.round_pt if self.round_coords else None)
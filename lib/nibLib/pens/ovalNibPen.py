@@ -1,18 +1,35 @@
 from __future__ import annotations
 
+import numpy as np
+
 from math import atan2, cos, degrees, sin, tan
 from nibLib.typing import TPoint
+from typing import List, Sequence, Tuple
 
 
 # from nibLib import DEBUG_CENTER_POINTS, DEBUG_CURVE_POINTS
 from nibLib.geometry import (
     angleBetweenPoints,
-    getPointsFromCurve,
+    getAdaptivePointsFromCurves,
+    getPathFromPoints,
+    getUniformPointsFromCurves,
     optimizePointPath,
 )
+from nibLib.pens.nibPen import memoized_segment
 from nibLib.pens.rectNibPen import RectNibPen
 
 
+# Settings for curve trace
+TRACE_ERROR = 0.5
+TRACE_CORNER_TOLERANCE = 1.0
+TRACE_MAXIMUM_SEGMENTS = 1000
+
+# Settings for compatible mode: The number of points per curve, and the number of
+# curves per side of the stroke
+COMPATIBLE_SAMPLES = 24
+COMPATIBLE_CURVES = 2
+
+
 class OvalNibPen(RectNibPen):
     def _get_tangent_point(self, alpha: float) -> TPoint:
         """Return the point on the ellipse at the given angle alpha.
@@ -34,6 +51,73 @@ class OvalNibPen(RectNibPen):
 
         return x, y
 
+    def _get_tangent_points(self, alphas: np.ndarray) -> np.ndarray:
+        """Return the rotated points on the ellipse for an array of angles.
+
+        Args:
+            alphas (np.ndarray): The tangent angles in radians, shape (N,).
+
+        Returns:
+            np.ndarray: The points, shape (N, 2), rotated by the nib angle.
+        """
+        alphas = alphas - self.angle
+        # Keep the points on the left side of the direction, so the sides of the
+        # stroke don't jump to the opposite side of the nib
+        t = np.arctan2(-self.b * np.cos(alphas), self.a * np.sin(alphas))
+        x = self.a * np.cos(t)
+        y = self.b * np.sin(t)
+        ca = cos(self.angle)
+        sa = sin(self.angle)
+        return np.column_stack((x * ca - y * sa, x * sa + y * ca))
+
+    def _sample_curve(
+        self, pt0: TPoint, pt1: TPoint, pt2: TPoint, pt3: TPoint
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Break a curve into points, with more points where it turns faster. In
+        compatible mode, the number of points is fixed.
+
+        Args:
+            pt0 (TPoint): The start point of the curve.
+            pt1 (TPoint): The first control point.
+            pt2 (TPoint): The second control point.
+            pt3 (TPoint): The end point.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The points and the tangents at the points.
+        """
+        with self._stage("sampling"):
+            if self.compatible:
+                points, tangents, _ = getUniformPointsFromCurves(
+                    [(pt0, pt1, pt2, pt3)], COMPATIBLE_SAMPLES
+                )
+            else:
+                points, tangents, _ = getAdaptivePointsFromCurves(
+                    [(pt0, pt1, pt2, pt3)],
+                    self._preview_tolerance(self.sampling_tolerance),
+                    max(self.a, self.b),
+                    min_length=self._preview_tolerance(0.5),
+                )
+        self._count("samples", len(points))
+        return points, tangents
+
+    def _fit_curves(self, points: Sequence[TPoint]) -> List[Tuple[TPoint, ...]]:
+        """Return a path with cubic curves that approximates a sequence of points. In
+        compatible mode, the path always has the same number of curves.
+
+        Args:
+            points (Sequence[TPoint]): The points.
+
+        Returns:
+            List[Tuple[TPoint, ...]]: The path.
+        """
+        return getPathFromPoints(
+            points,
+            error=TRACE_ERROR,
+            cornerTolerance=TRACE_CORNER_TOLERANCE,
+            maxSegments=TRACE_MAXIMUM_SEGMENTS,
+            segments=COMPATIBLE_CURVES if self.compatible else None,
+        )
+
     def _get_rotated_tangent_point(self, pt: TPoint) -> TPoint:
         x, y = pt
         x1 = x * cos(self.angle) - y * sin(self.angle)
@@ -41,6 +125,11 @@ class OvalNibPen(RectNibPen):
 
         return x1, y1
 
+    def _get_component_offset(self, dx: float, dy: float) -> TPoint:
+        # The stroke is computed around the unrotated guide drawing, and the output
+        # paths are rotated by the nib angle, so the offset is rotated as well
+        return self.transform_reverse.transformPoint((dx, dy))
+
     def _draw_nib_face(self, pt: TPoint) -> None:
         return
         save()
@@ -58,6 +147,7 @@ class OvalNibPen(RectNibPen):
         if not self.trace:
             self._draw_nib_face(pt)
 
+    @memoized_segment
     def _lineTo(self, pt: TPoint) -> None:
         if self._currentPoint is None:
             raise ValueError
@@ -84,12 +174,13 @@ class OvalNibPen(RectNibPen):
 
         self._currentPoint = pt
 
+    @memoized_segment
     def _curveToOne(self, pt1: TPoint, pt2: TPoint, pt3: TPoint) -> None:
         if self._currentPoint is None:
             raise ValueError
 
-        # Break curve into line segments
-        points = getPointsFromCurve((self._currentPoint, pt1, pt2, pt3), 5)
+        # Break curve into line segments, with more points where it turns faster
+        points, tangents = self._sample_curve(self._currentPoint, pt1, pt2, pt3)
 
         # Draw points of center line
         # if DEBUG_CENTER_POINTS:
@@ -101,59 +192,36 @@ class OvalNibPen(RectNibPen):
         #         rect(x - 1, y - 1, 2, 2)
         #     restore()
 
-        # Calculate angles between points
-
-        # The first angle is that of the curve start point to bcp1
-        angles = [angleBetweenPoints(self._currentPoint, pt1)]
-
-        for i in range(1, len(points)):
-            phi = angleBetweenPoints(points[i - 1], points[i])
-            angles.append(phi)
-
-        # The last angle is that of bcp2 point to the curve end point
-        angles.append(angleBetweenPoints(pt2, pt3))
-
-        # Find points on ellipse for each angle
-        inner = []
-        outer = []
-
-        # stroke(None)
-
-        for i, p in enumerate(points):
-            pt0 = self._get_tangent_point(angles[i] - self.angle)
-
-            x, y = self._get_rotated_tangent_point(pt0)
-            outer.append((p[0] + x, p[1] + y))
-            # if DEBUG_CURVE_POINTS:
-            #     # Draw outer points in red
-            #     save()
-            #     fill(1, 0, 0, self.alpha)
-            #     rect(p[0] + x - 1, p[1] + y - 1, 2, 2)
-            #     restore()
-
-            x, y = self._get_rotated_tangent_point((-pt0[0], -pt0[1]))
-            inner.append((p[0] + x, p[1] + y))
-            # if DEBUG_CURVE_POINTS:
-            #     # Draw inner points in green
-            #     save()
-            #     fill(0, 0.8, 0, self.alpha)
-            #     rect(p[0] + x - 1, p[1] + y - 1, 2, 2)
-            #     restore()
+        # Find points on ellipse for the tangent angle at each point
+        with self._stage("tangents"):
+            angles = np.arctan2(tangents[:, 1], tangents[:, 0])
+            offsets = self._get_tangent_points(angles)
+            outer = list(map(tuple, (points + offsets).tolist()))
+            inner = list(map(tuple, (points - offsets).tolist()))
 
         if inner and outer:
-
-            inner = optimizePointPath(inner, 0.3)
-            outer = optimizePointPath(outer, 0.3)
-
-            path = []
-            path.append((outer[0],))  # move
-            for p in outer[1:]:
-                path.append((p,))  # line
-            inner.reverse()
-            for p in inner:
-                path.append((p,))  # line
-            path.append((outer[0],))  # line
-            self.addPath(path)
+            if self.trace:
+                # Fit curves to both sides of the stroke
+                inner.reverse()
+                with self._stage("fitting"):
+                    outer = self._fit_curves(outer)
+                    inner = self._fit_curves(inner)
+                self._count("fitting_calls", 2)
+                self.addPath(outer + inner)
+            else:
+                with self._stage("optimize"):
+                    inner = optimizePointPath(inner, self._preview_tolerance(0.3))
+                    outer = optimizePointPath(outer, self._preview_tolerance(0.3))
+
+                path = []
+                path.append((outer[0],))  # move
+                for p in outer[1:]:
+                    path.append((p,))  # line
+                inner.reverse()
+                for p in inner:
+                    path.append((p,))  # line
+                path.append((outer[0],))  # line
+                self.addPath(path)
 
             if not self.trace:
                 self._draw_nib_face(pt3)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import Any, ContextManager, Dict, Iterator, List, Tuple
+
+
+# A reusable context manager for pens without profiler
+NO_STAGE: ContextManager[None] = nullcontext()
+
+
+class NibProfiler:
+    """
+    Collects the wall time per stage and counters of nib pens, e.g. how much time is
+    spent in curve sampling, tangent point lookup, point optimization, curve fitting
+    and drawing, and how many samples, points and segments are produced.
+
+    Pass a profiler to a pen with the `profiler` argument. One profiler can be shared
+    by several pens to accumulate the results.
+    """
+
+    def __init__(self, record_events=True) -> None:
+        """Initialize the profiler.
+
+        Args:
+            record_events (bool, optional): Whether to record each stage as an event
+                for the Chrome trace. Otherwise, only the totals are kept. Defaults to
+                True.
+        """
+        self.record_events = record_events
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all collected data."""
+        self.times: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.events: List[Tuple[str, float, float, int]] = []
+        self._origin = perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Return a context manager that measures the wall time of a stage.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            self.times[name] += end - start
+            self.calls[name] += 1
+            if self.record_events:
+                self.events.append((name, start, end, threading.get_ident()))
+
+    def count(self, name: str, n=1) -> None:
+        """Increase a counter.
+
+        Args:
+            name (str): The name of the counter.
+            n (int, optional): The amount to add. Defaults to 1.
+        """
+        self.counters[name] += n
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Return the collected data.
+
+        Returns:
+            Dict[str, Any]: The time in seconds and the number of calls of each stage,
+                and the counters.
+        """
+        return {
+            "stages": {
+                name: {"time": self.times[name], "calls": self.calls[name]}
+                for name in self.times
+            },
+            "counters": dict(self.counters),
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Return the collected data in the Chrome trace event format, which can be
+        loaded in chrome://tracing or https://ui.perfetto.dev.
+
+        Returns:
+            Dict[str, Any]: The trace.
+        """
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = [
+            {
+                "name": name,
+                "cat": "nibLib",
+                "ph": "X",
+                "ts": 1e6 * (start - self._origin),
+                "dur": 1e6 * (end - start),
+                "pid": pid,
+                "tid": tid,
+            }
+            for name, start, end, tid in self.events
+        ]
+        end = max((event[2] for event in self.events), default=self._origin)
+        if self.counters:
+            events.append(
+                {
+                    "name": "counters",
+                    "cat": "nibLib",
+                    "ph": "C",
+                    "ts": 1e6 * (end - self._origin),
+                    "pid": pid,
+                    "args": dict(self.counters),
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str | os.PathLike) -> None:
+        """Write the collected data to a file in the Chrome trace event format.
+
+        Args:
+            path (str | os.PathLike): The path of the JSON file.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+import numpy as np
+
 from math import atan2, pi
-from nibLib.pens.bezier import normalize_quadrant, split_at_extrema
-from nibLib.pens.nibPen import NibPen
+from nibLib.pens.bezier import (
+    normalize_quadrant,
+    split_at_extrema,
+    split_at_extrema_batch,
+)
+from nibLib.pens.nibPen import NibPen, memoized_segment
 from nibLib.typing import TPoint
-from typing import Tuple
+from typing import List, Tuple
+
+
+# The minimum number of consecutive curves that are split at the extrema in one batch.
+# For fewer curves, the overhead of the array operations is greater than the gain.
+BATCH_EXTREMA_CURVES = 12
 
 
 class RectNibPen(NibPen):
+    def reset(self) -> None:
+        super().reset()
+        # The curves of the current contour that have not been stroked yet
+        self._curves: List[Tuple[TPoint, TPoint, TPoint]] = []
+
     def transformPoint(self, pt: TPoint, d=1) -> TPoint:
         return (
             pt[0] + self.a * d,
@@ -35,11 +51,18 @@ class RectNibPen(NibPen):
         return A, B, C, D
 
     def _moveTo(self, pt: TPoint) -> None:
+        # Stroke the curves of a previous contour that was not closed or ended
+        self._flush_curves()
         t = self.transform.transformPoint(pt)
         self._currentPoint = t
         self.contourStart = pt
 
     def _lineTo(self, pt: TPoint) -> None:
+        self._flush_curves()
+        self._stroke_line(pt)
+
+    @memoized_segment
+    def _stroke_line(self, pt: TPoint) -> None:
         """
         Points of the nib face:
 
@@ -86,17 +109,50 @@ class RectNibPen(NibPen):
         self._currentPoint = t
 
     def _curveToOne(self, pt1, pt2, pt3):
-        if self._currentPoint is None:
+        if self._currentPoint is None and not self._curves:
             raise ValueError
 
-        # Insert extrema at angle
-        segments = split_at_extrema(
-            self._currentPoint, pt1, pt2, pt3, transform=self.transform
-        )
-        for segment in segments:
-            pt0, pt1, pt2, pt3 = segment
-            self._curveToOneNoExtrema(pt1, pt2, pt3)
+        # The curves are split at the extrema together when the run of curves ends
+        self._curves.append((pt1, pt2, pt3))
 
+    def _flush_curves(self) -> None:
+        """
+        Insert the extrema at the nib angle into the buffered curves, and stroke the
+        pieces. Longer runs of curves are split all at once.
+        """
+        if not self._curves:
+            return
+
+        curves = self._curves
+        self._curves = []
+        if len(curves) < BATCH_EXTREMA_CURVES:
+            for pt1, pt2, pt3 in curves:
+                with self._stage("extrema"):
+                    segments = split_at_extrema(
+                        self._currentPoint, pt1, pt2, pt3, transform=self.transform
+                    )
+                self._count("extrema_splits", len(segments) - 1)
+                for pt0, pt1, pt2, pt3 in segments:
+                    self._curveToOneNoExtrema(pt1, pt2, pt3)
+            return
+
+        with self._stage("extrema"):
+            t = self.transform
+            points = np.array(curves, dtype=float)
+            x = points[..., 0]
+            y = points[..., 1]
+            rotated = np.empty((len(curves), 4, 2))
+            rotated[:, 1:, 0] = t.xx * x + t.yx * y + t.dx
+            rotated[:, 1:, 1] = t.xy * x + t.yy * y + t.dy
+            # Each curve starts at the end of the previous one
+            rotated[0, 0] = self._currentPoint
+            rotated[1:, 0] = rotated[:-1, 3]
+            segments = split_at_extrema_batch(rotated)[0].tolist()
+        self._count("extrema_splits", len(segments) - len(curves))
+        for pt0, pt1, pt2, pt3 in segments:
+            self._curveToOneNoExtrema(tuple(pt1), tuple(pt2), tuple(pt3))
+
+    @memoized_segment
     def _curveToOneNoExtrema(self, pt1, pt2, pt3):
         if self._currentPoint is None:
             raise ValueError
@@ -257,11 +313,13 @@ class RectNibPen(NibPen):
         self._currentPoint = pt3
 
     def _closePath(self):
+        self._flush_curves()
         # Glyphs calls closePath though it is not really needed there ...?
         self._lineTo(self.contourStart)
         self._currentPoint = None
 
     def _endPath(self):
+        self._flush_curves()
         if self._currentPoint:
             # A1, B1, C1, D1 = self.transformedRect(self._currentPoint)
             # self.addPath(((A1,), (B1,), (C1,), (D1,)))
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import numpy as np
+
+from array import array
+from itertools import chain
+from nibLib.typing import TPoint
+from typing import Callable, Iterator, List, Sequence, Tuple
+
+
+# A path as used by the sinks: The first item contains the start point, the following
+# items contain one point for a line or three points for a cubic curve segment.
+NestedPath = Sequence[Sequence[TPoint]]
+
+
+def flatten_path(path: NestedPath) -> Tuple[List[TPoint], List[int]]:
+    """Convert a nested path to a flat list of points and the number of points of each
+    segment.
+
+    Args:
+        path (NestedPath): The nested path.
+
+    Returns:
+        Tuple[List[TPoint], List[int]]: The points and the segment types.
+    """
+    return list(chain.from_iterable(path)), [len(segment) for segment in path]
+
+
+def nest_path(points: Sequence[TPoint], types: Sequence[int]) -> List[List[TPoint]]:
+    """Convert a flat list of points and the number of points of each segment to a
+    nested path.
+
+    Args:
+        points (Sequence[TPoint]): The points.
+        types (Sequence[int]): The number of points of each segment.
+
+    Returns:
+        List[List[TPoint]]: The nested path.
+    """
+    path = []
+    i = 0
+    for n in types:
+        path.append(list(points[i : i + n]))
+        i += n
+    return path
+
+
+def draw_contour(pen, points: Sequence[TPoint], types: Sequence[int]) -> None:
+    """Draw a closed contour, given as flat points, into a fontTools segment pen.
+
+    Args:
+        pen (AbstractPen): The pen.
+        points (Sequence[TPoint]): The points.
+        types (Sequence[int]): The number of points of each segment.
+    """
+    if not types:
+        return
+    pen.moveTo(points[0])
+    i = types[0]
+    for n in types[1:]:
+        if n == 1:
+            pen.lineTo(points[i])
+        elif n == 3:
+            pen.curveTo(*points[i : i + 3])
+        else:
+            print("Unknown segment type:", points[i : i + n])
+        i += n
+    pen.closePath()
+
+
+class StrokePath:
+    """
+    The closed contours that a nib pen produces, in a compact form: All coordinates
+    are kept in one flat array, with the number of points of each segment and the
+    index of the first segment of each contour in two more arrays. The first segment
+    of each contour contains its start point, the following segments contain one point
+    for a line or three points for a cubic curve.
+
+    The contours are only converted to pen calls when they are drawn.
+    """
+
+    def __init__(self) -> None:
+        # x0, y0, x1, y1, ...
+        self.coords = array("d")
+        # The number of points of each segment
+        self.segment_types = array("B")
+        # The index of the first segment of each contour, and the number of segments
+        self.contour_offsets = array("L", (0,))
+
+    def __len__(self) -> int:
+        return len(self.contour_offsets) - 1
+
+    def __iter__(self) -> Iterator[List[List[TPoint]]]:
+        for points, types in self.contours():
+            yield nest_path(points, types)
+
+    @property
+    def points(self) -> np.ndarray:
+        """A copy of the points of all contours as an array of shape (N, 2)."""
+        return np.frombuffer(self.coords, dtype=float).reshape(-1, 2).copy()
+
+    def clear(self) -> None:
+        """Remove all contours."""
+        del self.coords[:]
+        del self.segment_types[:]
+        del self.contour_offsets[1:]
+
+    def add_contour(self, points: Sequence[TPoint], types: Sequence[int]) -> None:
+        """Add a contour from a flat sequence of points.
+
+        Args:
+            points (Sequence[TPoint]): The points.
+            types (Sequence[int]): The number of points of each segment.
+        """
+        self.coords.extend(chain.from_iterable(points))
+        self.segment_types.extend(types)
+        self.contour_offsets.append(len(self.segment_types))
+
+    def add_contours(
+        self, points: np.ndarray, types: Sequence[int], sizes: Sequence[int]
+    ) -> None:
+        """Add several contours at once from an array of points.
+
+        Args:
+            points (np.ndarray): The points of all contours, shape (N, 2).
+            types (Sequence[int]): The number of points of each segment.
+            sizes (Sequence[int]): The number of segments of each contour.
+        """
+        self.coords.frombytes(np.ascontiguousarray(points, dtype=float).tobytes())
+        self.segment_types.extend(types)
+        start = self.contour_offsets[-1]
+        self.contour_offsets.extend((start + np.cumsum(sizes)).tolist())
+
+    def add_path(self, path: NestedPath) -> None:
+        """Add a contour from a nested path.
+
+        Args:
+            path (NestedPath): The path.
+        """
+        self.add_contour(*flatten_path(path))
+
+    def contours(
+        self, round_pt: Callable[[TPoint], TPoint] | None = None
+    ) -> Iterator[Tuple[List[TPoint], Sequence[int]]]:
+        """Iterate over the contours as flat lists of points.
+
+        Args:
+            round_pt (Callable[[TPoint], TPoint] | None, optional): A function that is
+                applied to each point. Defaults to None.
+
+        Yields:
+            Tuple[List[TPoint], Sequence[int]]: The points and the number of points of
+                each segment of a contour.
+        """
+        points: List[TPoint] = list(zip(self.coords[::2], self.coords[1::2]))
+        if round_pt is not None:
+            points = [round_pt(pt) for pt in points]
+        types = self.segment_types
+        offsets = self.contour_offsets
+        i = 0
+        for c in range(len(self)):
+            contour_types = types[offsets[c] : offsets[c + 1]]
+            n = sum(contour_types)
+            yield points[i : i + n], contour_types
+            i += n
+
+    def draw(self, pen, round_pt: Callable[[TPoint], TPoint] | None = None) -> None:
+        """Draw all contours into a fontTools segment pen.
+
+        Args:
+            pen (AbstractPen): The pen.
+            round_pt (Callable[[TPoint], TPoint] | None, optional): A function that is
+                applied to each point before it is drawn. Defaults to None.
+        """
+        for points, types in self.contours(round_pt):
+            draw_contour(pen, points, types)
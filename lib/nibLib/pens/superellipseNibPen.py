@@ -1,56 +1,99 @@
 from __future__ import annotations
 
-import operator
+import numpy as np
 
 from fontTools.misc.transform import Transform
+from functools import lru_cache
 from math import cos, degrees, pi, sin
 from nibLib.typing import TPoint
 from nibLib.geometry import (
     angleBetweenPoints,
     getPathFromPoints,
-    getPointsFromCurve,
+    getSuperellipseTangentPoint,
+    getSuperellipseTangentPoints,
     optimizePointPath,
 )
+from nibLib.pens.nibPen import memoized_segment
 from nibLib.pens.ovalNibPen import OvalNibPen
-
-
-# Settings for curve trace
-TRACE_ERROR = 0.5
-TRACE_CORNER_TOLERANCE = 1.0
-TRACE_MAXIMUM_SEGMENTS = 1000
+from nibLib.pens.strokePath import flatten_path
+from typing import List, Tuple
 
 
 DEBUG_CENTER_POINTS = False
 DEBUG_CURVE_POINTS = False
 
 
-class SuperellipseNibPen(OvalNibPen):
-    def setup_nib(self) -> None:
-        steps = 100
-        points = []
-        # Build a quarter of the superellipse with the requested number of steps
-        for i in range(0, steps + 1):
-            t = i * 0.5 * pi / steps
-            points.append(
-                (
-                    self.a * cos(t) ** (2 / self.nib_superness),
-                    self.b * sin(t) ** (2 / self.nib_superness),
-                )
+# The number of nib faces to keep in the cache
+NIB_FACE_CACHE_SIZE = 128
+
+
+@lru_cache(maxsize=NIB_FACE_CACHE_SIZE)
+def get_nib_face(
+    a: float, b: float, superness: float, compatible=False, detail_level=0
+) -> Tuple[Tuple[TPoint, ...], Tuple[Tuple[TPoint, ...], ...]]:
+    """Return the geometry of a superelliptical nib face. The results are cached for
+    all pens in the process, so pens with the same nib parameters share the geometry.
+
+    Args:
+        a (float): The half width of the nib.
+        b (float): The half height of the nib.
+        superness (float): The superness of the nib shape.
+        compatible (bool, optional): Whether the path should have the same structure
+            for all nib parameters, i.e. two curves per quarter. Defaults to False.
+        detail_level (int, optional): The level of detail for zoomed out previews.
+            At level n, the face is built from fewer points, with 2 ** n times the
+            tolerances. Ignored in compatible mode. Defaults to 0.
+
+    Returns:
+        Tuple[Tuple[TPoint, ...], Tuple[Tuple[TPoint, ...], ...]]: The nib face as a
+            polygon, and as a path with curves for drawing.
+    """
+    if compatible:
+        detail_level = 0
+    factor = 1 << detail_level
+    steps = max(100 // factor, 8)
+    points = []
+    # Build a quarter of the superellipse with the requested number of steps
+    for i in range(0, steps + 1):
+        t = i * 0.5 * pi / steps
+        points.append(
+            (
+                a * cos(t) ** (2 / superness),
+                b * sin(t) ** (2 / superness),
             )
+        )
+
+    if compatible:
+        # Fit two curves to the quarter, and mirror them
+        path = getPathFromPoints(points, segments=2)
+        curves = [path[0] + path[1], path[1][-1:] + path[2]]
+        curves.extend(tuple((-x, y) for x, y in reversed(c)) for c in reversed(curves))
+        curves.extend(tuple((x, -y) for x, y in reversed(c)) for c in reversed(curves))
+        path = [(curves[0][0],)] + [c[1:] for c in curves]
+    else:
         try:
-            points = optimizePointPath(points, 0.02)
+            points = optimizePointPath(points, 0.02 * factor)
         except:
             print("Error optimizing point path.")
             pass
+        path = None
+
+    # Just add the remaining three quarters by transposing the existing points
+    points.extend([(-x, y) for x, y in reversed(points)])
+    points.extend([(x, -y) for x, y in reversed(points)])
+
+    if path is None:
+        path = getPathFromPoints(points, error=factor)
+    return tuple(points), tuple(path)
 
-        # Just add the remaining three quarters by transposing the existing points
-        points.extend([(-x, y) for x, y in reversed(points)])
-        points.extend([(x, -y) for x, y in reversed(points)])
 
-        self.nib_face_path = points
-        self.nib_face_path_transformed = points.copy()
-        self.nib_drawing_path = getPathFromPoints(points)
-        self.cache_angle = None
+class SuperellipseNibPen(OvalNibPen):
+    def setup_nib(self) -> None:
+        self.nib_face_path, self.nib_drawing_path = get_nib_face(
+            self.a, self.b, self.nib_superness, self.compatible, self.detail_level
+        )
+        # The nib face rotated by the nib angle, see _get_nib_face_stamp
+        self._nib_face_stamp: Tuple[float, List[TPoint], List[int]] | None = None
 
     def _get_rotated_point(self, pt: TPoint, phi: float) -> TPoint:
         x, y = pt
@@ -61,25 +104,21 @@ class SuperellipseNibPen(OvalNibPen):
 
         return x1, y1
 
-    def transform_nib_path(self, alpha: float) -> None:
-        t = Transform().rotate(-alpha)
-        self.nib_face_path_transformed = t.transformPoints(self.nib_face_path)
-        self.cache_angle = alpha
-
     def _get_tangent_point(self, alpha: float) -> TPoint:
+        """Return the point on the superellipse at the given tangent angle alpha.
 
-        # Calculate the point on the superellipse
-        # at the given tangent angle alpha.
+        Args:
+            alpha (float): The tangent angle in radians.
 
-        # For now, we do this the pedestrian way, until I can figure out
-        # how to calculate the tangent point directly.
+        Returns:
+            TPoint: The tangent point.
+        """
+        return getSuperellipseTangentPoint(self.a, self.b, self.nib_superness, alpha)
 
-        if self.cache_angle != alpha:
-            self.transform_nib_path(alpha)
-
-        x, y = max(self.nib_face_path_transformed, key=operator.itemgetter(1))
-        x, y = Transform().rotate(alpha).transformPoint((x, y))  # .rotate(-self.angle)
-        return x, y
+    def _get_component_offset(self, dx: float, dy: float) -> TPoint:
+        # The guide drawing is rotated before stroking and back afterwards, so the
+        # output moves with the guide drawing
+        return dx, dy
 
     def _moveTo(self, pt: TPoint) -> None:
         t = self.transform.transformPoint(pt)
@@ -87,6 +126,7 @@ class SuperellipseNibPen(OvalNibPen):
         self.contourStart = pt
         self._draw_nib_face(pt)
 
+    @memoized_segment
     def _lineTo(self, pt: TPoint) -> None:
         if self._currentPoint is None:
             raise ValueError
@@ -112,6 +152,7 @@ class SuperellipseNibPen(OvalNibPen):
 
         self._currentPoint = t
 
+    @memoized_segment
     def _curveToOne(self, pt1: TPoint, pt2: TPoint, pt3: TPoint) -> None:
         if self._currentPoint is None:
             raise ValueError
@@ -123,8 +164,8 @@ class SuperellipseNibPen(OvalNibPen):
         t2 = self.transform.transformPoint(pt2)
         t3 = self.transform.transformPoint(pt3)
 
-        # Break curve into line segments
-        points = getPointsFromCurve((self._currentPoint, t1, t2, t3), 5)
+        # Break curve into line segments, with more points where it turns faster
+        points, tangents = self._sample_curve(self._currentPoint, t1, t2, t3)
 
         # Draw points of center line
         # if DEBUG_CENTER_POINTS:
@@ -135,54 +176,44 @@ class SuperellipseNibPen(OvalNibPen):
         #         x, y = self.transform_reverse.transformPoint(p)
         #         rect(x - 1, y - 1, 2, 2)
 
-        # Calculate angles between points
-
-        # The first angle is that of the curve start point to bcp1
-        angles = [angleBetweenPoints(self._currentPoint, t1)]
-
-        for i in range(1, len(points)):
-            phi = angleBetweenPoints(points[i - 1], points[i])
-            angles.append(phi)
-
-        # The last angle is that of bcp2 point to the curve end point
-        angles.append(angleBetweenPoints(t2, t3))
-
-        # Find points on ellipse for each angle
-        inner = []
-        outer = []
-
-        # stroke(None)
-        for i, p in enumerate(points):
-            x, y = self._get_tangent_point(angles[i])
-
-            pp = self._get_rotated_point((p[0] + x, p[1] + y), self.angle)
-            outer.append(pp)
-
-            if not self.trace and DEBUG_CURVE_POINTS:
-                # Draw outer points in red
-                fill(1, 0, 0, self.alpha)
-                pr = self.transform_reverse.transformPoint((p[0] + x, p[1] + y))
-                rect(pr[0] - 1, pr[1] - 1, 2, 2)
-
-            pp = self._get_rotated_point((p[0] - x, p[1] - y), self.angle)
-            inner.append(pp)
-            if not self.trace and DEBUG_CURVE_POINTS:
-                # Draw inner points in green
-                fill(0, 0.8, 0, self.alpha)
-                pr = self.transform_reverse.transformPoint((p[0] - x, p[1] - y))
-                rect(pr[0] - 1, pr[1] - 1, 2, 2)
+        # Find points on superellipse for the tangent angle at each point
+        with self._stage("tangents"):
+            angles = np.arctan2(tangents[:, 1], tangents[:, 0])
+            offsets = getSuperellipseTangentPoints(
+                self.a, self.b, self.nib_superness, angles
+            )
+            ca = cos(self.angle)
+            sa = sin(self.angle)
+            rotation = np.array(((ca, sa), (-sa, ca)))
+            outer = list(map(tuple, ((points + offsets) @ rotation).tolist()))
+            inner = list(map(tuple, ((points - offsets) @ rotation).tolist()))
+
+        # if not self.trace and DEBUG_CURVE_POINTS:
+        #     # Draw outer points in red, inner points in green
+        #     fill(1, 0, 0, self.alpha)
+        #     for x, y in outer:
+        #         rect(x - 1, y - 1, 2, 2)
+        #     fill(0, 0.8, 0, self.alpha)
+        #     for x, y in inner:
+        #         rect(x - 1, y - 1, 2, 2)
 
         if inner and outer:
             if self.trace:
                 outer.reverse()
-                outer = getPathFromPoints(outer)
-                inner = getPathFromPoints(inner)
-                self.path.append(outer + inner)
+                with self._stage("fitting"):
+                    outer = self._fit_curves(outer)
+                    inner = self._fit_curves(inner)
+                self._count("fitting_calls", 2)
+                self.addPathRaw(outer + inner)
             else:
-                inner = optimizePointPath(inner, 0.3)
-                outer = optimizePointPath(outer, 0.3)
-                outer.reverse()
-                optimized = optimizePointPath(outer + inner, 1)
+                with self._stage("optimize"):
+                    dist = self._preview_tolerance(0.3)
+                    inner = optimizePointPath(inner, dist)
+                    outer = optimizePointPath(outer, dist)
+                    outer.reverse()
+                    optimized = optimizePointPath(
+                        outer + inner, self._preview_tolerance(1)
+                    )
                 self.addPath([[self.transform.transformPoint(o)] for o in optimized])
             self._draw_nib_face(pt3)
 
@@ -197,13 +228,24 @@ class SuperellipseNibPen(OvalNibPen):
     def _endPath(self) -> None:
         self._currentPoint = None
 
+    def _get_nib_face_stamp(self) -> Tuple[List[TPoint], List[int]]:
+        """Return the drawing path of the nib face, rotated by the nib angle, as flat
+        points and segment types. It is computed once per nib face and angle, so the
+        face only has to be translated to each on-curve point.
+
+        Returns:
+            Tuple[List[TPoint], List[int]]: The points and segment types.
+        """
+        stamp = self._nib_face_stamp
+        if stamp is None or stamp[0] != self.angle:
+            points, types = flatten_path(self.nib_drawing_path)
+            points = Transform().rotate(self.angle).transformPoints(points)
+            stamp = self._nib_face_stamp = (self.angle, points, types)
+        return stamp[1], stamp[2]
+
     def _draw_nib_face(self, pt: TPoint) -> None:
         x, y = pt
-        nib = []
-        t = Transform().translate(x, y).rotate(self.angle)
-        for seg in self.nib_drawing_path:
-            seg_path = []
-            for p in seg:
-                seg_path.append(t.transformPoint(p))
-            nib.append(seg_path)
-        self.addPathRaw(nib)
+        with self._stage("nib_face"):
+            points, types = self._get_nib_face_stamp()
+            points = [(px + x, py + y) for px, py in points]
+        self._emit(points, types)
@@ -0,0 +1,160 @@
+"""
+Compute strokes in the background while the nib settings are changed interactively.
+
+Dragging a slider in the nib UI changes the settings many times per second. Instead of
+stroking the guide glyph for every change on the UI thread, the UI submits a job to a
+`StrokeScheduler`. The scheduler waits until the settings have stopped changing for a
+short time, runs only the latest job on a worker thread, and cancels jobs that are
+superseded while they run. Finished results are handed to a callback, which the UI
+runs on its main thread.
+"""
+
+from __future__ import annotations
+
+import threading
+import traceback
+
+from functools import partial
+from time import monotonic
+from typing import Any, Callable, Hashable, Tuple
+
+
+# The time in seconds that the settings must stay the same before a job is started
+DEBOUNCE_DELAY = 0.05
+
+# A job receives a function that tells whether it has been cancelled. It should check
+# it regularly and return None when it is cancelled.
+Job = Callable[[Callable[[], bool]], Any]
+
+
+class StrokeScheduler:
+    """
+    Run the latest of a series of rapidly submitted jobs on a worker thread. Jobs are
+    identified by a key, e.g. the guide drawing and the nib settings. Submitting a job
+    replaces the pending one and cancels the running one, unless they have the same
+    key. A job is only started after no other job was submitted for `delay` seconds.
+    """
+
+    def __init__(
+        self,
+        on_result: Callable[[Hashable, Any], None],
+        delay=DEBOUNCE_DELAY,
+        dispatch: Callable[[Callable[[], None]], None] | None = None,
+    ) -> None:
+        """Initialize the scheduler and start its worker thread.
+
+        Args:
+            on_result (Callable[[Hashable, Any], None]): The function that receives
+                the key and the result of each finished job.
+            delay (float, optional): The time in seconds that must pass without a new
+                job before the latest job is started. Defaults to `DEBOUNCE_DELAY`.
+            dispatch (Callable[[Callable[[], None]], None] | None, optional): A
+                function that calls a function on the thread which should receive the
+                results, e.g. the main thread of the UI. Defaults to None, i.e. the
+                results are delivered on the worker thread.
+        """
+        self.delay = delay
+        self._on_result = on_result
+        self._dispatch = dispatch
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._pending: Tuple[int, Hashable, Job] | None = None
+        self._running: Tuple[int, Hashable] | None = None
+        self._submitted = 0.0
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="nibLib stroke scheduler", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def busy(self) -> bool:
+        """Whether a job is pending or running."""
+        with self._condition:
+            return self._pending is not None or self._running is not None
+
+    def submit(self, key: Hashable, job: Job) -> None:
+        """Submit a job. It replaces the pending job and cancels the running job. If
+        the pending or running job has the same key, the new job is ignored.
+
+        Args:
+            key (Hashable): The key of the job.
+            job (Job): The job.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            if self._pending is not None and self._pending[1] == key:
+                return
+            if self._pending is None and self._running is not None:
+                if self._running[1] == key:
+                    return
+            self._generation += 1
+            self._pending = (self._generation, key, job)
+            self._submitted = monotonic()
+            self._condition.notify()
+
+    def cancel(self) -> None:
+        """Cancel the pending and the running job."""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+
+    def close(self, timeout: float | None = None) -> None:
+        """Cancel all jobs and stop the worker thread.
+
+        Args:
+            timeout (float | None, optional): The time in seconds to wait for the
+                running job to notice that it was cancelled. Defaults to None, i.e.
+                don't wait.
+        """
+        with self._condition:
+            self._closed = True
+            self._generation += 1
+            self._pending = None
+            self._condition.notify()
+        if timeout is not None:
+            self._thread.join(timeout)
+
+    def _next_job(self) -> Tuple[int, Hashable, Job] | None:
+        # Wait until a job is pending and no other job was submitted for the delay.
+        # Return None when the scheduler is closed.
+        with self._condition:
+            while True:
+                if self._closed:
+                    return None
+                if self._pending is None:
+                    self._condition.wait()
+                    continue
+                remaining = self._submitted + self.delay - monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                generation, key, job = self._pending
+                self._pending = None
+                self._running = (generation, key)
+                return generation, key, job
+
+    def _run(self) -> None:
+        while True:
+            task = self._next_job()
+            if task is None:
+                return
+            generation, key, job = task
+
+            def cancelled() -> bool:
+                return self._generation != generation
+
+            try:
+                result = job(cancelled)
+            except Exception:
+                traceback.print_exc()
+                result = None
+            with self._condition:
+                self._running = None
+                if result is None or cancelled():
+                    continue
+            if self._dispatch is None:
+                self._on_result(key, result)
+            else:
+                self._dispatch(partial(self._on_result, key, result))
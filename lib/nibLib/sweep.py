@@ -0,0 +1,229 @@
+"""
+Stroke one guide drawing with a superelliptical nib at many nib angles at once.
+
+A nib pen strokes the guide drawing for one nib setting. To compare a glyph at many
+nib angles, the sweep flattens the guide drawing only once and computes the tangent
+points of the nib and the nib faces for all angles with array operations. The outlines
+are the same as those of `SuperellipseNibPen`, except that in preview mode the sides of
+curves are not simplified.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+from fontTools.pens.basePen import BasePen
+from fontTools.pens.recordingPen import replayRecording
+from nibLib.geometry import (
+    getAdaptivePointsFromCurves,
+    getPathFromPoints,
+    getSuperellipseTangentPoints,
+)
+from nibLib.pens.nibPen import SAMPLING_TOLERANCE
+from nibLib.pens.ovalNibPen import (
+    TRACE_CORNER_TOLERANCE,
+    TRACE_ERROR,
+    TRACE_MAXIMUM_SEGMENTS,
+)
+from nibLib.pens.strokePath import StrokePath, flatten_path
+from nibLib.pens.superellipseNibPen import get_nib_face
+from nibLib.typing import TPoint
+from typing import Any, List, Sequence, Tuple
+
+
+class _SkeletonPen(BasePen):
+    """
+    Collect the parts of a drawing in the order in which a superellipse nib pen
+    strokes them: a nib face at each on-curve point, and the lines and curves between
+    them. Unlike the nib pens, which stroke components through their glyph set, the
+    skeleton has no glyph set, so components are ignored.
+    """
+
+    def __init__(self) -> None:
+        BasePen.__init__(self, None)
+        self.items: List[Tuple[str, Any]] = []
+        self.lines: List[Tuple[TPoint, TPoint]] = []
+        self.curves: List[Tuple[TPoint, TPoint, TPoint, TPoint]] = []
+        self._start: TPoint | None = None
+
+    def _moveTo(self, pt: TPoint) -> None:
+        self._start = pt
+        self.items.append(("face", pt))
+
+    def _lineTo(self, pt: TPoint) -> None:
+        self.items.append(("line", len(self.lines)))
+        self.lines.append((self._getCurrentPoint(), pt))
+        self.items.append(("face", pt))
+
+    def _curveToOne(self, pt1: TPoint, pt2: TPoint, pt3: TPoint) -> None:
+        self.items.append(("curve", len(self.curves)))
+        self.curves.append((self._getCurrentPoint(), pt1, pt2, pt3))
+        self.items.append(("face", pt3))
+
+    def _closePath(self) -> None:
+        # The nib pens close the contour with a line back to the start
+        self._lineTo(self._start)
+
+    def addComponent(self, baseName: str, transformation) -> None:
+        pass
+
+
+def _fit_side(points: np.ndarray) -> List[Tuple[TPoint, ...]]:
+    # Fit curves to one side of a stroked curve, with the settings of the nib pens
+    return getPathFromPoints(
+        points,
+        error=TRACE_ERROR,
+        cornerTolerance=TRACE_CORNER_TOLERANCE,
+        maxSegments=TRACE_MAXIMUM_SEGMENTS,
+    )
+
+
+def _sweep(
+    skeleton: _SkeletonPen,
+    angles: np.ndarray,
+    a: float,
+    b: float,
+    superness: float,
+    trace: bool,
+    tolerance: float,
+) -> List[StrokePath]:
+    # Stroke the skeleton with a nib of one size at all angles
+    num = len(angles)
+    cos = np.cos(angles)[:, None]
+    sin = np.sin(angles)[:, None]
+
+    def rotate(v: np.ndarray) -> np.ndarray:
+        # Rotate vectors of shape (K, N, 2) by the angle of each row
+        x = v[..., 0]
+        y = v[..., 1]
+        return np.stack((x * cos - y * sin, x * sin + y * cos), axis=-1)
+
+    def support(directions: np.ndarray) -> np.ndarray:
+        # The tangent points of the rotated nibs for the direction vectors of shape
+        # (N, 2), shape (K, N, 2)
+        alphas = np.arctan2(directions[:, 1], directions[:, 0])
+        alphas = alphas[None, :] - angles[:, None]
+        # A segment without length is stroked in the direction of the nib
+        alphas[:, ~directions.any(axis=1)] = 0
+        return rotate(getSuperellipseTangentPoints(a, b, superness, alphas))
+
+    if skeleton.curves:
+        points, tangents, offsets = getAdaptivePointsFromCurves(
+            skeleton.curves, tolerance, max(a, b)
+        )
+        curve_offsets = support(tangents)
+    if skeleton.lines:
+        lines = np.array(skeleton.lines, dtype=float)
+        line_offsets = support(lines[:, 1] - lines[:, 0])
+    face_path = get_nib_face(a, b, superness)[1]
+    face_points, face_types = flatten_path(face_path)
+    faces = rotate(np.broadcast_to(np.array(face_points), (num, len(face_points), 2)))
+
+    # The parts which have the same structure for all angles, shape (K, N, 2)
+    shared: List[np.ndarray] = []
+    # The points of each contour for each angle, where the structure differs
+    parts: List[List[np.ndarray]] = [[] for _ in range(num)]
+    types: List[List[int]] = [[] for _ in range(num)]
+    sizes: List[List[int]] = [[] for _ in range(num)]
+
+    def add_shared(block: np.ndarray, block_types: Sequence[int]) -> None:
+        shared.append(block)
+        for k in range(num):
+            types[k].extend(block_types)
+            sizes[k].append(len(block_types))
+
+    def flush_shared() -> None:
+        if shared:
+            block = np.concatenate(shared, axis=1)
+            for k in range(num):
+                parts[k].append(block[k])
+            shared.clear()
+
+    for kind, value in skeleton.items:
+        if kind == "face":
+            add_shared(faces + value, face_types)
+        elif kind == "line":
+            (c, t), o = lines[value], line_offsets[:, value]
+            add_shared(np.stack((c + o, c - o, t - o, t + o), axis=1), (1, 1, 1, 1))
+        else:
+            start, end = offsets[value], offsets[value + 1]
+            center = points[start:end]
+            o = curve_offsets[:, start:end]
+            outer = center + o
+            inner = center - o
+            if not trace:
+                block = np.concatenate((outer[:, ::-1], inner), axis=1)
+                add_shared(block, (1,) * block.shape[1])
+                continue
+            flush_shared()
+            for k in range(num):
+                path_points, path_types = flatten_path(
+                    _fit_side(outer[k, ::-1]) + _fit_side(inner[k])
+                )
+                parts[k].append(np.array(path_points, dtype=float).reshape(-1, 2))
+                types[k].extend(path_types)
+                sizes[k].append(len(path_types))
+    flush_shared()
+
+    paths = []
+    for k in range(num):
+        path = StrokePath()
+        if parts[k]:
+            path.add_contours(np.concatenate(parts[k]), types[k], sizes[k])
+        paths.append(path)
+    return paths
+
+
+def sweep_angles(
+    guide: Sequence[Tuple[str, Tuple[Any, ...]]],
+    angles: Sequence[float] | np.ndarray,
+    widths: float | Sequence[float] | np.ndarray = 60,
+    height: float = 2,
+    superness=2.5,
+    trace=False,
+    sampling_tolerance=SAMPLING_TOLERANCE,
+) -> List[StrokePath]:
+    """Stroke a guide drawing with a superelliptical nib at many nib angles. The
+    drawing is flattened once for each nib width, and the tangent points of the nib
+    and the nib faces are computed for all angles at once. An oval nib is a
+    superellipse with a superness of 2. Rectangular nibs are not supported, because
+    the structure of their strokes depends on the angle.
+
+    Args:
+        guide (Sequence[Tuple[str, Tuple[Any, ...]]]): The drawing of the guide glyph,
+            as recorded by a fontTools RecordingPen. Components are ignored, so
+            composite glyphs must be recorded with a DecomposingRecordingPen.
+        angles (Sequence[float] | np.ndarray): The nib angles in radians.
+        widths (float | Sequence[float] | np.ndarray, optional): The nib width, or one
+            nib width for each angle. Defaults to 60.
+        height (float, optional): The nib height. Defaults to 2.
+        superness (float, optional): The superness of the nib shape. Defaults to 2.5.
+        trace (bool, optional): Whether curves should be fitted to the sides of the
+            stroked curves, as when tracing. Otherwise, the sides are polygons, as in
+            the preview. Defaults to False.
+        sampling_tolerance (float, optional): The tolerance for the adaptive sampling
+            of curves. Defaults to `SAMPLING_TOLERANCE`.
+
+    Returns:
+        List[StrokePath]: The stroked outline for each angle.
+    """
+    angles = np.asarray(angles, dtype=float).reshape(-1)
+    widths = np.broadcast_to(np.asarray(widths, dtype=float), angles.shape)
+    skeleton = _SkeletonPen()
+    replayRecording(guide, skeleton)
+
+    results: List[StrokePath] = [StrokePath() for _ in angles]
+    for width in np.unique(widths).tolist():
+        index = np.flatnonzero(widths == width)
+        paths = _sweep(
+            skeleton,
+            angles[index],
+            0.5 * width,
+            0.5 * height,
+            superness,
+            trace,
+            sampling_tolerance,
+        )
+        for i, path in zip(index.tolist(), paths):
+            results[i] = path
+    return results
@@ -3,6 +3,8 @@ from __future__ import annotations
 import vanilla
 
 from defconAppKit.windows.baseWindow import BaseWindowController
+from fontTools.pens.recordingPen import RecordingPen
+from functools import partial
 from math import degrees, radians
 from nibLib import (
     def_angle_key,
@@ -13,8 +15,14 @@ from nibLib import (
     def_super_key,
     def_model_key,
 )
+from nibLib.batch import record_guide
+from nibLib.cache import StrokeCache
 from nibLib.pens import nib_models
-from typing import Any, List
+from nibLib.pens.drawing import RecordingSink
+from nibLib.pens.nibPen import SegmentCache, get_detail_level
+from nibLib.scheduler import StrokeScheduler
+from PyObjCTools.AppHelper import callAfter
+from typing import Any, Callable, Dict, Hashable, List, Tuple
 
 
 class JKNib(BaseWindowController):
@@ -31,6 +39,15 @@ class JKNib(BaseWindowController):
         self._guide_layer_name: str | None = None
         self.guide_layer = None
         self.nib_pen = nib_models[self.model]
+        self._preview_pen = None
+        self.stroke_cache = StrokeCache()
+        # The preview is stroked on a worker thread, the results are delivered on the
+        # main thread
+        self.scheduler = StrokeScheduler(
+            self._preview_stroke_finished, dispatch=callAfter
+        )
+        # The drawing key and stroke of the last finished preview
+        self._last_stroke: Tuple[Any, RecordingSink] | None = None
 
         self._draw_nib_faces = False
         self._draw_in_preview_mode = False
@@ -218,6 +235,7 @@ class JKNib(BaseWindowController):
         pass
 
     def windowCloseCallback(self, sender) -> None:
+        self.scheduler.close()
         if self.font is not None:
             self.save_settings()
         if self.caller is not None:
@@ -377,6 +395,12 @@ class JKNib(BaseWindowController):
         self._draw_nib_faces = sender.get()
         self._update_current_glyph_view()
 
+    def get_glyph_set(self):
+        """Return the glyph set from which the nib pens draw the base glyphs of
+        components. Components are ignored if it is None.
+        """
+        return None
+
     def get_guide_representation(self, glyph, font, angle):
         # TODO: Rotate, add extreme points, rotate back
         return glyph.copy()
@@ -387,7 +411,162 @@ class JKNib(BaseWindowController):
     def _setup_draw(self, preview=False) -> None:
         pass
 
-    def draw_preview_glyph(self, preview=False) -> None:
+    def get_preview_settings(self, scale=1.0) -> Tuple[Any, ...]:
+        """Return the settings that affect the preview stroke, as a snapshot that can
+        be used on the worker thread.
+
+        Args:
+            scale (float, optional): The view scale. Defaults to 1.0.
+
+        Returns:
+            Tuple[Any, ...]: The nib pen class, angle, width, height, superness,
+                whether the nib faces are drawn, and the level of detail for the view
+                scale.
+        """
+        return (
+            self.nib_pen,
+            self.angle,
+            self.width,
+            self.height,
+            self.superness,
+            self._draw_nib_faces,
+            get_detail_level(scale),
+        )
+
+    def get_preview_pen(self, settings: Tuple[Any, ...] | None = None):
+        """Return a nib pen for the preview. The pen object is reused as long as the
+        nib model doesn't change. It memoizes the stroke pieces of each segment, so
+        after an edit only the changed segments are stroked again.
+
+        Args:
+            settings (Tuple[Any, ...] | None, optional): The settings as returned by
+                `get_preview_settings`. Defaults to None, i.e. the current settings.
+
+        Returns:
+            NibPen: The pen.
+        """
+        if settings is None:
+            settings = self.get_preview_settings()
+        nib_pen, angle, width, height, superness, draw_nib_faces, detail = settings
+        # The scale at which the level of detail starts
+        scale = 1 / (1 << detail)
+        p = self._preview_pen
+        if p is None or type(p) is not nib_pen:
+            p = nib_pen(
+                None,
+                angle,
+                width,
+                height,
+                draw_nib_faces,
+                nib_superness=superness,
+                segment_cache=SegmentCache(),
+            )
+            p.set_scale(scale)
+            self._preview_pen = p
+        else:
+            p.configure(
+                angle=angle,
+                width=width,
+                height=height,
+                show_nib_faces=draw_nib_faces,
+                nib_superness=superness,
+                scale=scale,
+            )
+        return p
+
+    def get_preview_key(
+        self, guide, scale=1.0
+    ) -> Tuple[Tuple[Any, ...], RecordingPen, Dict[str, Any]]:
+        """Record a guide glyph for the preview and return the key of its stroke,
+        which contains the drawing of the guide glyph and its components and the nib
+        settings.
+
+        Args:
+            guide (GSLayer | RGlyph): The guide glyph or layer.
+            scale (float, optional): The view scale. Defaults to 1.0.
+
+        Returns:
+            Tuple[Tuple[Any, ...], RecordingPen, Dict[str, Any]]: The key, the recorded
+                drawing and the glyph set of the recorded base glyphs.
+        """
+        # The base glyphs of the components are recorded here, as the glyph set must
+        # not be accessed from the worker thread
+        recording, bases, drawing = record_guide(guide, self.get_glyph_set())
+        return (drawing,) + self.get_preview_settings(scale), recording, bases
+
+    def get_preview_stroke(self, guide, scale=1.0) -> RecordingSink | None:
+        """Return the stroked outline of a guide glyph with the current settings. The
+        result is cached, keyed by the contents of the guide glyph, its components and
+        the nib settings, so redraws without edits don't stroke the glyph again. When
+        the view is zoomed out, the stroke is computed with fewer points.
+
+        A stroke that is not cached is computed on a worker thread, and the view is
+        updated when it is finished. Until then, the last finished stroke of the same
+        guide drawing is returned, or None.
+
+        Args:
+            guide (GSLayer | RGlyph): The guide glyph or layer.
+            scale (float, optional): The view scale. Defaults to 1.0.
+
+        Returns:
+            RecordingSink | None: The recorded paths of the stroked outline.
+        """
+        key, recording, bases = self.get_preview_key(guide, scale)
+        stroke = self.stroke_cache.get(key)
+        if stroke is not None:
+            self._last_stroke = (key[0], stroke)
+            return stroke
+        return self.request_preview_stroke(key, recording, bases)
+
+    def request_preview_stroke(
+        self, key: Tuple[Any, ...], recording: RecordingPen, bases: Dict[str, Any]
+    ) -> RecordingSink | None:
+        """Stroke a guide drawing on the worker thread. The result is stored in the
+        stroke cache.
+
+        Args:
+            key (Tuple[Any, ...]): The key as returned by `get_preview_key`.
+            recording (RecordingPen): The recorded drawing of the guide glyph.
+            bases (Dict[str, Any]): The glyph set of the recorded base glyphs.
+
+        Returns:
+            RecordingSink | None: The last finished stroke of the same guide drawing,
+                to be shown until the new one is finished, or None.
+        """
+        settings = key[1:]
+        self.scheduler.submit(
+            key, partial(self._stroke_preview, recording, bases, settings)
+        )
+        if self._last_stroke is not None and self._last_stroke[0] == key[0]:
+            return self._last_stroke[1]
+        return None
+
+    def _stroke_preview(
+        self,
+        recording,
+        bases: Dict[str, Any],
+        settings: Tuple[Any, ...],
+        cancelled: Callable[[], bool],
+    ) -> RecordingSink | None:
+        # Stroke a guide drawing on the worker thread. Return None if a newer stroke
+        # was requested in the meantime.
+        stroke = RecordingSink()
+        p = self.get_preview_pen(settings)
+        p.glyphSet = bases or None
+        p.sink = stroke
+        for operator, args in recording.value:
+            getattr(p, operator)(*args)
+            if operator in ("closePath", "endPath") and cancelled():
+                return None
+        return stroke
+
+    def _preview_stroke_finished(self, key: Hashable, stroke: RecordingSink) -> None:
+        # Called on the main thread when a preview stroke is finished
+        self.stroke_cache.set(key, stroke)
+        self._last_stroke = (key[0], stroke)
+        self._update_current_glyph_view()
+
+    def draw_preview_glyph(self, preview=False, scale=1.0) -> None:
         raise NotImplementedError
 
     def save_to_lib(self, font_or_glyph, libkey, value) -> None:
@@ -3,6 +3,7 @@ from __future__ import annotations
 from GlyphsApp import Glyphs, GSBackgroundLayer
 
 # from GlyphsApp.drawingTools import *
+from nibLib.pens.drawing import AppKitSink
 from nibLib.ui import JKNib
 from typing import List
 
@@ -60,23 +61,17 @@ class JKNibGlyphs(JKNib):
             return
 
         # save()
-        # TODO: Reuse pen object.
-        # Needs modifications to the pens before possible.
-        p = self.nib_pen(
-            self.font,
-            self.angle,
-            self.width,
-            self.height,
-            self._draw_nib_faces,
-            nib_superness=self.superness,
-        )
-        p._scale = scale
-
         try:
-            self.guide_layer.draw(p)
+            stroke = self.get_preview_stroke(self.guide_layer, scale)
         except AttributeError:
             print("AttributeError", self.guide_layer)
-            pass
+            return
+
+        if stroke is None:
+            # The stroke is still being computed
+            return
+
+        stroke.replay(AppKitSink(), width=1 / scale)
         # restore()
 
     def _trace_callback(self, sender) -> None:
@@ -84,7 +79,7 @@ class JKNibGlyphs(JKNib):
             return
 
         p = self.nib_pen(
-            self.font,
+            self.get_glyph_set(),
             self.angle,
             self.width,
             self.height,
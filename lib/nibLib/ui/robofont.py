@@ -5,11 +5,31 @@ from __future__ import annotations
 # from math import degrees
 from mojo.drawingTools import fill, lineJoin, restore, save, strokeWidth, stroke
 from mojo.events import addObserver, removeObserver
-from mojo.roboFont import CurrentFont, CurrentGlyph, RGlyph
+from mojo.roboFont import AllFonts, CurrentFont, CurrentGlyph, RGlyph
 from mojo.UI import UpdateCurrentGlyphView
+from nibLib.batch import record_guide
+from nibLib.cache import StrokeCache
+from nibLib.pens.drawing import AppKitSink, RecordingSink
 from nibLib.ui import JKNib
-from nibLib import DEBUG, rf_guide_key
-from typing import Any, List
+from nibLib import DEBUG, rf_guide_key, rf_stroke_key
+from typing import Any, Dict, List
+
+# The preview strokes of all glyphs, shared by the nib UI and the stroke
+# representation. Strokes computed on the worker thread of the UI are picked up by the
+# representation factory.
+_preview_strokes = StrokeCache()
+
+# The names of the keyword arguments of the stroke representation, in the order of
+# the preview settings
+STROKE_SETTINGS = (
+    "nib_pen",
+    "angle",
+    "width",
+    "height",
+    "superness",
+    "nib_faces",
+    "detail_level",
+)
 
 
 def NibGuideGlyphFactory(glyph, font, angle: float):
@@ -25,6 +45,65 @@ def NibGuideGlyphFactory(glyph, font, angle: float):
     return g
 
 
+def NibStrokeGlyphFactory(
+    glyph,
+    nib_pen,
+    angle: float,
+    width: float,
+    height: float,
+    superness: float,
+    nib_faces=False,
+    detail_level=0,
+) -> RecordingSink:
+    """Return the preview stroke of a guide glyph. defcon caches the stroke until the
+    glyph or the base glyph of one of its components is changed.
+
+    Args:
+        glyph (defcon.Glyph): The guide glyph.
+        nib_pen (Type[NibPen]): The nib pen class.
+        angle (float): The nib angle in radians.
+        width (float): The nib width.
+        height (float): The nib height.
+        superness (float): The superness of the nib shape.
+        nib_faces (bool, optional): Whether the nib faces are drawn. Defaults to False.
+        detail_level (int, optional): The level of detail. Defaults to 0.
+
+    Returns:
+        RecordingSink: The recorded paths of the stroked outline.
+    """
+    recording, glyph_set, drawing = record_guide(glyph, glyph.layer)
+    settings = (nib_pen, angle, width, height, superness, nib_faces, detail_level)
+    key = (drawing,) + settings
+    stroke = _preview_strokes.get(key)
+    if stroke is None:
+        stroke = RecordingSink()
+        p = nib_pen(
+            glyph_set or None,
+            angle,
+            width,
+            height,
+            nib_faces,
+            nib_superness=superness,
+            sink=stroke,
+        )
+        p.set_scale(1 / (1 << detail_level))
+        recording.replay(p)
+        _preview_strokes.set(key, stroke)
+    return stroke
+
+
+# The representation factories and the notifications that destroy their
+# representations, by key. None means the default, i.e. a change of the glyph.
+_factories = {
+    rf_guide_key: (NibGuideGlyphFactory, None),
+    # defcon also notifies composite glyphs when a (nested) base glyph changes
+    rf_stroke_key: (
+        NibStrokeGlyphFactory,
+        ("Glyph.Changed", "Glyph.ComponentBaseGlyphDataChanged"),
+    ),
+}
+
+
 def _registerFactory():
     # From https://github.com/typesupply/glyph-nanny/blob/master/Glyph%20Nanny.roboFontExt/lib/glyphNanny.py
     # always register if debugging
@@ -32,23 +111,26 @@ def _registerFactory():
     from defcon import registerRepresentationFactory, Glyph
 
     if DEBUG:
-        if rf_guide_key in Glyph.representationFactories:
+        if any(key in Glyph.representationFactories for key in _factories):
             for font in AllFonts():
                 for glyph in font:
                     glyph.naked().destroyAllRepresentations()
-        registerRepresentationFactory(rf_guide_key, NibGuideGlyphFactory)
+        for key, (factory, notifications) in _factories.items():
+            registerRepresentationFactory(Glyph, key, factory, notifications)
     else:
-        if rf_guide_key not in Glyph.representationFactories:
-            registerRepresentationFactory(Glyph, rf_guide_key, NibGuideGlyphFactory)
+        for key, (factory, notifications) in _factories.items():
+            if key not in Glyph.representationFactories:
+                registerRepresentationFactory(Glyph, key, factory, notifications)
 
 
 def _unregisterFactory():
     from defcon import unregisterRepresentationFactory, Glyph
 
-    try:
-        unregisterRepresentationFactory(Glyph, rf_guide_key)
-    except:
-        pass
+    for key in _factories:
+        try:
+            unregisterRepresentationFactory(Glyph, key)
+        except:
+            pass
 
 
 class JKNibRoboFont(JKNib):
@@ -64,6 +146,7 @@ class JKNibRoboFont(JKNib):
 
     def __init__(self) -> None:
         super(JKNibRoboFont, self).__init__(CurrentGlyph(), CurrentFont())
+        self.stroke_cache = _preview_strokes
 
     def envSpecificInit(self) -> None:
         self.setUpBaseWindowBehavior()
@@ -112,15 +195,60 @@ class JKNibRoboFont(JKNib):
         # RF-specific: Draw in space center
         value = sender.get()
         if value:
-            addObserver(self, "_previewFull", "spaceCenterDraw")
+            addObserver(self, "_draw_space_center", "spaceCenterDraw")
         else:
             removeObserver(self, "spaceCenterDraw")
 
+    def get_glyph_set(self):
+        # The base glyphs of components in the guide layer are in the same layer
+        if self.font is None or self.guide_layer_name is None:
+            return None
+        return self.font.getLayer(self.guide_layer_name)
+
     def get_guide_representation(self, glyph: RGlyph, font, angle: float):
         return glyph.getLayer(self.guide_layer_name).getRepresentation(
             rf_guide_key, font=font, angle=angle
         )
 
+    def get_stroke_representation_kwargs(self, scale=1.0) -> Dict[str, Any]:
+        """Return the keyword arguments of the stroke representation with the current
+        settings.
+
+        Args:
+            scale (float, optional): The view scale. Defaults to 1.0.
+
+        Returns:
+            Dict[str, Any]: The keyword arguments.
+        """
+        return dict(zip(STROKE_SETTINGS, self.get_preview_settings(scale)))
+
+    def get_stroke_representation(self, guide: RGlyph, scale=1.0) -> RecordingSink:
+        """Return the preview stroke of a guide glyph, computed on the main thread if
+        it is not cached yet.
+
+        Args:
+            guide (RGlyph): The guide glyph.
+            scale (float, optional): The view scale. Defaults to 1.0.
+
+        Returns:
+            RecordingSink: The recorded paths of the stroked outline.
+        """
+        return guide.naked().getRepresentation(
+            rf_stroke_key, **self.get_stroke_representation_kwargs(scale)
+        )
+
+    def get_preview_stroke(self, guide: RGlyph, scale=1.0) -> RecordingSink | None:
+        # Use the stroke representation if it is cached, without recording the glyph.
+        # Otherwise, stroke the glyph on the worker thread; the representation picks
+        # up the finished stroke from the stroke cache.
+        glyph = guide.naked()
+        kwargs = self.get_stroke_representation_kwargs(scale)
+        if not glyph.hasCachedRepresentation(rf_stroke_key, **kwargs):
+            key, recording, bases = self.get_preview_key(guide, scale)
+            if key not in self.stroke_cache:
+                return self.request_preview_stroke(key, recording, bases)
+        return glyph.getRepresentation(rf_stroke_key, **kwargs)
+
     def _trace_callback(self, sender) -> None:
         if self.guide_layer_name is None:
             self._update_layers()
@@ -130,7 +258,7 @@ class JKNibRoboFont(JKNib):
             glyph=guide_glyph, font=guide_glyph.font, angle=self.angle
         )
         p = self.nib_pen(
-            self.font,
+            self.get_glyph_set(),
             self.angle,
             self.width,
             self.height,
@@ -142,14 +270,27 @@ class JKNibRoboFont(JKNib):
         p.trace_path(self.glyph)
 
     def _draw_preview(self, notification, preview=False) -> None:
-        self.draw_preview_glyph(preview=preview)
+        self.draw_preview_glyph(preview=preview, scale=notification.get("scale", 1.0))
 
     def _preview(self, notification) -> None:
-        self.draw_preview_glyph(False)
+        self.draw_preview_glyph(False, notification.get("scale", 1.0))
 
     def _previewFull(self, notification) -> None:
         if self._draw_in_preview_mode:
-            self.draw_preview_glyph(True)
+            self.draw_preview_glyph(True, notification.get("scale", 1.0))
+
+    def _draw_space_center(self, notification) -> None:
+        glyph = notification["glyph"]
+        if glyph is None or self.guide_layer_name is None:
+            return
+        scale = notification.get("scale", 1.0)
+        stroke = self.get_stroke_representation(
+            glyph.getLayer(self.guide_layer_name), scale
+        )
+        save()
+        self._setup_draw(preview=True)
+        stroke.replay(AppKitSink(), width=1 / scale)
+        restore()
 
     def _glyph_changed(self, notification) -> None:
         if self.glyph is not None:
@@ -173,27 +314,20 @@ class JKNibRoboFont(JKNib):
         stroke(None)
         lineJoin(self.line_join)
 
-    def draw_preview_glyph(self, preview=False) -> None:
+    def draw_preview_glyph(self, preview=False, scale=1.0) -> None:
         if self.guide_layer_name is None:
             self._update_layers()
             return
-        guide_glyph = self.glyph.getLayer(self.guide_layer_name)
-        glyph = self.get_guide_representation(
-            glyph=guide_glyph, font=guide_glyph.font, angle=self.angle
+        stroke = self.get_preview_stroke(
+            self.glyph.getLayer(self.guide_layer_name), scale
         )
+        if stroke is None:
+            # The stroke is still being computed
+            return
+
         save()
         self._setup_draw(preview=preview)
-        # TODO: Reuse pen object.
-        # Needs modifications to the pens before possible.
-        p = self.nib_pen(
-            self.font,
-            self.angle,
-            self.width,
-            self.height,
-            self._draw_nib_faces,
-            nib_superness=self.superness,
-        )
-        glyph.draw(p)
+        stroke.replay(AppKitSink(), width=1 / scale)
         restore()
 
     def _font_resign(self, notification=None) -> None:
@@ -0,0 +1,143 @@
+from math import radians
+from unittest import TestCase
+
+from defcon import Font
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.pens.transformPen import TransformPen
+from nibLib import def_angle_key, def_model_key, def_width_key
+from nibLib.cache import StrokeCache
+from nibLib.batch import (
+    NibSettings,
+    check_compatibility,
+    record_guide,
+    trace_recording,
+    trace_font,
+    trace_masters,
+    trace_recordings,
+)
+
+
+class NibSettingsTest(TestCase):
+    def test_from_lib(self):
+        lib = {def_angle_key: 45.0, def_model_key: "Oval", def_width_key: 80}
+        settings = NibSettings.from_lib(lib, width=None, height=10)
+        assert settings.model == "Oval"
+        assert settings.angle == radians(45)
+        assert settings.width == 80
+        assert settings.height == 10
+        assert settings.superness == 2.5
+
+
+def guide_recording():
+    guide = RecordingPen()
+    guide.moveTo((100, 100))
+    guide.lineTo((300, 100))
+    guide.curveTo((400, 100), (400, 300), (200, 400))
+    guide.closePath()
+    return guide
+
+
+class TraceRecordingsTest(TestCase):
+    def test_trace_recordings(self):
+        guide = guide_recording()
+        settings = NibSettings(model="Oval")
+        serial = trace_recordings([guide.value] * 3, settings, jobs=1)
+        parallel = trace_recordings([guide.value] * 3, settings, jobs=2)
+        assert serial == parallel
+        assert serial[0][0][0] == "moveTo"
+
+    def test_trace_font_components(self):
+        font = Font()
+        guide = font.newLayer("guide")
+        guide_recording().replay(guide.newGlyph("a").getPen())
+        guide.newGlyph("b").getPen().addComponent("a", (1, 0, 0, 1, 200, 0))
+        # A nested component, and one without base glyph
+        pen = guide.newGlyph("c").getPen()
+        pen.addComponent("b", (1, 0, 0, 1, 0, 100))
+        pen.addComponent("missing", (1, 0, 0, 1, 0, 0))
+        guide.newGlyph("empty")
+        # A composite in the target layer is replaced by the traced outline
+        font.newGlyph("b").getPen().addComponent("a", (1, 0, 0, 1, 200, 0))
+
+        settings = NibSettings(model="Superellipse", height=8)
+        skipped = trace_font(
+            font, settings, guide_layer="guide", round_coords=True, jobs=1
+        )
+        assert skipped == {"empty": "no contours or components in guide layer"}
+
+        # The components are stroked like their decomposed outlines
+        for name, offset in (("b", (200, 0)), ("c", (200, 100))):
+            expected = RecordingPen()
+            guide_recording().replay(TransformPen(expected, (1, 0, 0, 1) + offset))
+            traced = RecordingPen()
+            font[name].draw(traced)
+            results = trace_recordings([expected.value], settings, round_coords=True)
+            assert traced.value == results[0]
+
+    def test_nested_components_shared_cache(self):
+        # The nested base glyph differs between the traces, e.g. two masters
+        cache = StrokeCache()
+        settings = NibSettings(model="Superellipse", height=8)
+        top = RecordingPen()
+        top.addComponent("mid", (1, 0, 0, 1, 0, 0))
+        mid = RecordingPen()
+        mid.addComponent("base", (1, 0, 0, 1, 0, 0))
+        for size in (100, 400):
+            base = RecordingPen()
+            base.moveTo((0, 0))
+            base.lineTo((size, size))
+            base.endPath()
+            components = {"mid": mid.value, "base": base.value}
+            traced = trace_recording(
+                top.value, settings, components=components, component_cache=cache
+            )
+            expected = trace_recording(base.value, settings)
+            assert traced == expected
+
+    def test_record_guide(self):
+        font = Font()
+        guide_recording().replay(font.newGlyph("a").getPen())
+        font.newGlyph("b").getPen().addComponent("a", (1, 0, 0, 1, 200, 0))
+        recording, bases, key = record_guide(font["b"], font)
+        assert recording.value[0][0] == "addComponent"
+        assert list(bases) == ["a"]
+        assert record_guide(font["b"])[2] == key[:1]
+
+        # The key changes when the base glyph changes
+        font["a"].move((10, 0))
+        assert record_guide(font["b"], font)[2] != key
+
+
+class TraceMastersTest(TestCase):
+    def test_check_compatibility(self):
+        guide = guide_recording().value
+        assert check_compatibility([guide, guide]) is None
+        problem = check_compatibility([guide, guide[:1] + guide[2:]], ["a", "b"])
+        assert problem == "a and b differ in contour 0"
+        problem = check_compatibility([guide, guide + guide])
+        assert problem == "drawing 0 has 1 contours, drawing 1 has 2"
+
+    def test_trace_masters(self):
+        fonts = []
+        for width in (20, 60, 120):
+            font = Font()
+            font.lib[def_width_key] = width
+            guide = font.newLayer("guide")
+            for name in ("a", "b"):
+                guide_recording().replay(guide.newGlyph(name).getPen())
+            fonts.append(font)
+        del fonts[1].layers["guide"]["b"]
+
+        for model in ("Oval", "Superellipse"):
+            settings = [
+                NibSettings.from_lib(font.lib, model=model, height=8) for font in fonts
+            ]
+            problems = trace_masters(fonts, settings, guide_layer="guide", jobs=1)
+            assert problems == {"b": "not in guide layer of master 1"}, model
+            recordings = []
+            for font in fonts:
+                pen = RecordingPen()
+                font["a"].draw(pen)
+                recordings.append(pen.value)
+            assert recordings[0] != recordings[1]
+            assert check_compatibility(recordings) is None, model
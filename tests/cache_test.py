@@ -0,0 +1,44 @@
+from unittest import TestCase
+
+from fontTools.pens.recordingPen import RecordingPen
+from nibLib.cache import StrokeCache, drawing_key, resolved_drawing_key
+
+
+def record(x):
+    pen = RecordingPen()
+    pen.moveTo((0, 0))
+    pen.curveTo((x, 0), (100, 50), (100, 100))
+    pen.endPath()
+    return pen
+
+
+class CacheTest(TestCase):
+    def test_drawing_key(self):
+        assert drawing_key(record(50)) == drawing_key(record(50))
+        assert drawing_key(record(50)) != drawing_key(record(51))
+        hash(drawing_key(record(50)))
+
+    def test_resolved_drawing_key(self):
+        composite = RecordingPen()
+        composite.addComponent("a", (1, 0, 0, 1, 0, 0))
+        composite.addComponent("missing", (1, 0, 0, 1, 0, 0))
+        nested = RecordingPen()
+        nested.addComponent("b", (1, 0, 0, 1, 0, 0))
+        keys = [
+            resolved_drawing_key(composite, {"a": nested, "b": record(x)}.get)
+            for x in (50, 51)
+        ]
+        assert keys[0] != keys[1]
+        assert keys[0][0] == drawing_key(composite)
+
+    def test_stroke_cache(self):
+        cache = StrokeCache(size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        # "b" was the least recently used entry
+        assert "b" not in cache
+        assert cache.get("b") is None
+        assert len(cache) == 2
+        assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,61 @@
+import numpy as np
+
+from unittest import TestCase
+
+from nibLib.fitting import fitCubics, fitCubicsFixed
+from nibLib.geometry import getPointsFromCurves
+
+
+def max_distance(curves, points):
+    # The maximum distance of the points from the flattened curves
+    flat = np.concatenate([getPointsFromCurves([c], 0.05)[0] for c in curves])
+    d = points[:, None] - flat[None]
+    return np.hypot(d[..., 0], d[..., 1]).min(axis=1).max()
+
+
+class FittingTest(TestCase):
+    def test_arc(self):
+        t = np.linspace(0, np.pi, 200)
+        arc = np.column_stack((300 * np.cos(t), 300 * np.sin(t)))
+        for error in (0.1, 0.5, 2.0):
+            curves = fitCubics(arc, error)
+            assert 1 <= len(curves) <= 6
+            assert max_distance(curves, arc) <= error
+            # The curves are connected
+            for c0, c1 in zip(curves, curves[1:]):
+                assert (c0[3] == c1[0]).all()
+            assert (curves[0][0] == arc[0]).all() and (curves[-1][3] == arc[-1]).all()
+
+    def test_corner(self):
+        points = np.array(
+            [(x, 0) for x in range(0, 101, 5)] + [(100, y) for y in range(5, 101, 5)],
+            dtype=float,
+        )
+        curves = fitCubics(points, 0.5)
+        assert max_distance(curves, points) <= 0.5
+        # The corner is an on-curve point
+        assert any((c[3] == (100, 0)).all() for c in curves)
+
+    def test_degenerate(self):
+        assert fitCubics([(0, 0)]) == []
+        assert fitCubics([(0, 0), (0, 0)]) == []
+        (curve,) = fitCubics([(0, 0), (0, 0), (30, 0)])
+        assert curve.tolist() == [[0, 0], [10, 0], [20, 0], [30, 0]]
+
+    def test_max_segments(self):
+        t = np.linspace(0, 4 * np.pi, 400)
+        wave = np.column_stack((t * 50, 100 * np.sin(t)))
+        assert len(fitCubics(wave, 0.1)) > 2
+        assert len(fitCubics(wave, 0.1, maxSegments=2)) <= 2
+
+    def test_fixed(self):
+        t = np.linspace(0, np.pi, 25)
+        for radius in (50, 300):
+            arc = np.column_stack((radius * np.cos(t), radius * np.sin(t)))
+            curves = fitCubicsFixed(arc, 2)
+            assert len(curves) == 2
+            assert max_distance(curves, arc) <= 0.015 * radius
+            # The curves join smoothly
+            d0 = curves[0][3] - curves[0][2]
+            d1 = curves[1][1] - curves[1][0]
+            assert abs(d0[0] * d1[1] - d0[1] * d1[0]) < 1e-6
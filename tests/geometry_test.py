@@ -1,6 +1,16 @@
+import numpy as np
+
 from unittest import TestCase
 
-from nibLib.geometry import getPathFromPoints
+from nibLib.geometry import (
+    getAdaptivePointsFromCurves,
+    getCurveLengths,
+    getPathFromPoints,
+    getPointsFromCurves,
+    getSuperellipseTangentPoint,
+    getSuperellipseTangentPoints,
+    optimizePointPath,
+)
 
 
 class GeometryTest(TestCase):
@@ -14,3 +24,88 @@ class GeometryTest(TestCase):
                 (100.0, 100.0),
             ),
         ]
+
+    def test_getPointsFromCurves(self):
+        curves = [
+            ((0, 0), (0, 0), (100, 200), (300, 0)),
+            ((300, 0), (400, 0), (500, 100), (500, 200)),
+        ]
+        points, tangents, offsets = getPointsFromCurves(curves, 5)
+        assert offsets[0] == 0 and offsets[-1] == len(points) == len(tangents)
+        for i, curve in enumerate(curves):
+            start, end = offsets[i], offsets[i + 1] - 1
+            assert tuple(points[start]) == curve[0]
+            assert tuple(points[end]) == curve[3]
+            # The number of points depends on the arc length
+            assert end - start == np.ceil(getCurveLengths([curve])[0] / 5)
+        # The tangent at the degenerate start point points to the second control point
+        assert tangents[0][0] > 0 and tangents[0][0] * 2 == tangents[0][1]
+        assert tuple(tangents[offsets[1]] / 300) == (1, 0)
+
+    def test_getAdaptivePointsFromCurves(self):
+        curves = [
+            ((0, 0), (0, 0), (100, 200), (300, 0)),
+            ((0, 0), (100, 0), (200, 0), (300, 0)),
+            ((0, 0), (300, 300), (0, 300), (300, 0)),
+        ]
+        points, tangents, offsets = getAdaptivePointsFromCurves(curves, 0.25, 30)
+        assert offsets[-1] == len(points) == len(tangents)
+        for i, curve in enumerate(curves):
+            pts = points[offsets[i] : offsets[i + 1]]
+            assert tuple(pts[0]) == curve[0] and tuple(pts[-1]) == curve[3]
+
+            # No point of the exact curve is farther than the tolerance from the
+            # polyline
+            exact, _, _ = getPointsFromCurves([curve], 0.1)
+            a = pts[:-1]
+            d = pts[1:] - a
+            v = exact[:, None] - a
+            t = np.clip((v * d).sum(-1) / np.maximum((d * d).sum(-1), 1e-12), 0, 1)
+            dist = np.hypot(*(v - t[..., None] * d).transpose(2, 0, 1)).min(axis=1)
+            assert dist.max() <= 0.25
+        # A straight curve needs no points in between
+        assert offsets[2] - offsets[1] == 2
+        # Fewer points than with a fixed step
+        assert len(points) < len(getPointsFromCurves(curves, 5)[0]) / 2
+
+    def test_getSuperellipseTangentPoints(self):
+        alphas = np.linspace(-np.pi, np.pi, 37)
+        for n in (1.5, 2.0, 2.5, 6.0):
+            pts = getSuperellipseTangentPoints(30, 10, n, alphas)
+            # All points are on the superellipse
+            on_curve = np.abs(pts[:, 0] / 30) ** n + np.abs(pts[:, 1] / 10) ** n
+            assert np.allclose(on_curve, 1)
+            for alpha, pt in zip(alphas, pts):
+                assert np.allclose(getSuperellipseTangentPoint(30, 10, n, alpha), pt)
+        # For an ellipse, the tangent at the point has the angle alpha
+        for alpha in alphas:
+            x, y = getSuperellipseTangentPoint(30, 10, 2, alpha)
+            tx, ty = -30 * y / 10, 10 * x / 30
+            assert abs(tx * np.sin(alpha) - ty * np.cos(alpha)) < 1e-9
+
+    def test_getSuperellipseTangentPoints_diamond(self):
+        # A superness of 1 is a diamond, n close to 1 must not overflow
+        alphas = np.linspace(-np.pi, np.pi, 37)
+        directions = np.stack((-np.sin(alphas), np.cos(alphas)), axis=-1)
+        vertices = np.array(((30, 0), (-30, 0), (0, 10), (0, -10)))
+        farthest = (directions @ vertices.T).max(axis=1)
+        for n in (0.5, 1.0, 1.0001):
+            pts = getSuperellipseTangentPoints(30, 10, n, alphas)
+            assert np.allclose(np.sum(pts * directions, axis=1), farthest)
+            for alpha, pt in zip(alphas, pts):
+                assert np.allclose(getSuperellipseTangentPoint(30, 10, n, alpha), pt)
+
+    def test_optimizePointPath(self):
+        # Collinear points are removed
+        pts = [(0, 0), (10, 0), (20, 0), (30, 0), (30, 10)]
+        assert optimizePointPath(pts) == [(0, 0), (30, 0), (30, 10)]
+        assert optimizePointPath(pts, rdp=True) == [(0, 0), (30, 0), (30, 10)]
+        assert optimizePointPath(pts[:2]) == pts[:2]
+
+        # In RDP mode, no removed point is farther than dist from the result
+        t = np.linspace(0, np.pi, 500)
+        arc = np.column_stack((300 * np.cos(t), 300 * np.sin(t)))
+        optimized = np.array(optimizePointPath(arc, 0.3, rdp=True))
+        assert 2 < len(optimized) < 100
+        radii = np.hypot(*((optimized[:-1] + optimized[1:]) / 2).T)
+        assert 300 - radii.min() <= 0.3
@@ -0,0 +1,386 @@
+import numpy as np
+
+from math import radians
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from fontTools.pens.areaPen import AreaPen
+from fontTools.pens.pointPen import PointToSegmentPen
+from fontTools.pens.recordingPen import RecordingPen, RecordingPointPen
+from fontTools.pens.transformPen import TransformPen
+from fontTools.misc.transform import Transform
+from nibLib.cache import StrokeCache
+from nibLib.pens import nib_models
+from nibLib.pens.bezier import split_at_extrema, split_at_extrema_batch
+from nibLib.pens.drawing import NullSink, PenSink, RecordingSink
+from nibLib.pens.nibPen import (
+    MAX_DETAIL_LEVEL,
+    SAMPLING_TOLERANCE,
+    SegmentCache,
+    get_detail_level,
+)
+from nibLib.pens.ovalNibPen import TRACE_ERROR
+from nibLib.pens.profiling import NibProfiler
+from nibLib.pens.rectNibPen import RectNibPen
+from nibLib.pens.strokePath import StrokePath
+from nibLib.pens.superellipseNibPen import SuperellipseNibPen
+
+try:
+    import pathops
+except ImportError:
+    pathops = None
+
+
+def draw_guide(pen):
+    # A closed contour with a line and a curve
+    pen.moveTo((100, 100))
+    pen.lineTo((300, 100))
+    pen.curveTo((400, 100), (400, 300), (200, 400))
+    pen.closePath()
+
+
+class NibPenTest(TestCase):
+    def test_preview_sinks(self):
+        for model, pen_class in nib_models.items():
+            sink = RecordingSink()
+            p = pen_class(None, radians(30), 60, 10, sink=sink)
+            draw_guide(p)
+            assert sink.paths, model
+
+            rec = RecordingPen()
+            sink.replay(PenSink(rec))
+            assert rec.value[0][0] == "moveTo", model
+            assert rec.value[-1][0] == "closePath", model
+
+            p = pen_class(None, radians(30), 60, 10, sink=NullSink())
+            draw_guide(p)
+
+    def test_trace(self):
+        for model, pen_class in nib_models.items():
+            p = pen_class(None, radians(30), 60, 10, trace=True, round_coords=True)
+            draw_guide(p)
+            rec = RecordingPen()
+            p.draw_traced(rec)
+            assert rec.value, model
+            for _, pts in rec.value:
+                for x, y in pts:
+                    assert isinstance(x, int) and isinstance(y, int), model
+
+    @skipUnless(pathops, "skia-pathops is not installed")
+    def test_remove_overlap(self):
+        for model, pen_class in nib_models.items():
+            p = pen_class(None, radians(30), 60, 10, trace=True, round_coords=True)
+            draw_guide(p)
+            pieces = RecordingPen()
+            p.draw_traced(pieces)
+            union = RecordingPen()
+            p.draw_traced(union, remove_overlap=True, correct_direction=True)
+
+            num_pieces = sum(op == "closePath" for op, _ in pieces.value)
+            num_contours = sum(op == "closePath" for op, _ in union.value)
+            assert 1 <= num_contours < num_pieces, model
+            for _, pts in union.value:
+                for x, y in pts:
+                    assert isinstance(x, int) and isinstance(y, int), model
+
+            # The outer contour is counter-clockwise
+            area = AreaPen()
+            union.replay(area)
+            assert area.value > 0, model
+
+    def test_out_pen(self):
+        for model, pen_class in nib_models.items():
+            p = pen_class(None, radians(30), 60, 10, trace=True, round_coords=True)
+            draw_guide(p)
+            buffered = RecordingPen()
+            p.draw_traced(buffered)
+
+            # Stream to a segment pen
+            streamed = RecordingPen()
+            p = pen_class(
+                None,
+                radians(30),
+                60,
+                10,
+                trace=True,
+                round_coords=True,
+                out_pen=streamed,
+            )
+            draw_guide(p)
+            assert not p.path, model
+            assert streamed.value == buffered.value, model
+
+            # Stream to a point pen
+            points = RecordingPointPen()
+            p.reset()
+            p.out_pen = points
+            draw_guide(p)
+            converted = RecordingPen()
+            points.replay(PointToSegmentPen(converted))
+            assert converted.value == buffered.value, model
+
+    def test_oval_trace_curves(self):
+        p = nib_models["Oval"](None, radians(30), 60, 10, trace=True)
+        draw_guide(p)
+        traced = RecordingPen()
+        p.draw_traced(traced)
+        operators = [operator for operator, _ in traced.value]
+        assert "curveTo" in operators
+
+        # Fewer segments than the polygon of the preview
+        sink = RecordingSink()
+        p = nib_models["Oval"](None, radians(30), 60, 10, sink=sink)
+        draw_guide(p)
+        preview = RecordingPen()
+        sink.replay(PenSink(preview))
+        assert len(traced.value) < len(preview.value)
+
+        # The sides of a round nib on an arc are arcs as well. They stay within the
+        # fitting error and the sampling tolerance of the exact offset curve.
+        p = nib_models["Oval"](None, radians(30), 60, 60, trace=True)
+        k = 0.5523 * 200
+        p.moveTo((200, 0))
+        p.curveTo((200, k), (k, 200), (0, 200))
+        p.endPath()
+        traced = RecordingPen()
+        p.draw_traced(traced)
+        tolerance = TRACE_ERROR + SAMPLING_TOLERANCE + 0.1
+        t = np.linspace(0, 1, 21)[:, None]
+        curves = 0
+        for (operator, args), (_, previous) in zip(traced.value[1:], traced.value):
+            if operator != "curveTo":
+                continue
+            p0, p1, p2, p3 = np.array((previous[-1],) + args)
+            points = (
+                (1 - t) ** 3 * p0
+                + 3 * (1 - t) ** 2 * t * p1
+                + 3 * (1 - t) * t**2 * p2
+                + t**3 * p3
+            )
+            r = np.hypot(points[:, 0], points[:, 1])
+            assert np.minimum(abs(r - 170), abs(r - 230)).max() < tolerance
+            curves += 1
+        assert curves >= 2
+
+    def test_stroke_path(self):
+        paths = [
+            [((0, 0),), ((10, 0),), ((10, 10),)],
+            [((20, 0),), ((30, 0), (40, 10), (40, 20)), ((20, 20),)],
+        ]
+        sp = StrokePath()
+        for path in paths:
+            sp.add_path(path)
+        assert len(sp) == 2
+        assert [[list(s) for s in path] for path in paths] == list(sp)
+        assert sp.points.shape == (8, 2)
+
+        rec = RecordingPen()
+        sp.draw(rec, round_pt=lambda pt: (int(pt[0]), int(pt[1])))
+        assert rec.value[:4] == [
+            ("moveTo", ((0, 0),)),
+            ("lineTo", ((10, 0),)),
+            ("lineTo", ((10, 10),)),
+            ("closePath", ()),
+        ]
+        assert rec.value[5] == ("curveTo", ((30, 0), (40, 10), (40, 20)))
+
+        sp.clear()
+        assert len(sp) == 0 and not list(sp) and sp.points.shape == (0, 2)
+
+    def test_nib_face_cache(self):
+        p1 = SuperellipseNibPen(None, radians(30), 60, 10, nib_superness=3.0)
+        p2 = SuperellipseNibPen(None, radians(45), 60, 10, nib_superness=3.0)
+        p3 = SuperellipseNibPen(None, radians(30), 60, 10, nib_superness=3.5)
+        assert p1.nib_drawing_path is p2.nib_drawing_path
+        assert p1.nib_drawing_path is not p3.nib_drawing_path
+
+        # The rotated nib face follows the nib angle
+        faces = []
+        for p in (p1, p1, p2):
+            p.sink = RecordingSink()
+            p._draw_nib_face((100, 200))
+            faces.append(p.sink.paths)
+            p1.configure(angle=radians(45))
+        assert faces[0] != faces[1]
+        assert faces[1] == faces[2]
+
+    def test_reuse(self):
+        for model, pen_class in nib_models.items():
+            p = pen_class(None, radians(30), 60, 10, trace=True)
+            draw_guide(p)
+            p.configure(angle=radians(45), width=80, nib_superness=4.0)
+            draw_guide(p)
+            reused = RecordingPen()
+            p.draw_traced(reused)
+
+            p = pen_class(None, radians(45), 80, 10, nib_superness=4.0, trace=True)
+            draw_guide(p)
+            fresh = RecordingPen()
+            p.draw_traced(fresh)
+            assert reused.value == fresh.value, model
+
+    def test_segment_cache(self):
+        for model, pen_class in nib_models.items():
+            cache = SegmentCache()
+            p = pen_class(None, radians(30), 60, 10, trace=True, segment_cache=cache)
+            draw_guide(p)
+            first = RecordingPen()
+            p.draw_traced(first)
+            assert cache.hits == 0, model
+
+            # Draw the same glyph again, all segments are cached
+            p.reset()
+            misses = cache.misses
+            draw_guide(p)
+            second = RecordingPen()
+            p.draw_traced(second)
+            assert first.value == second.value, model
+            assert cache.misses == misses, model
+
+            # Edit the curve; the line segment is still cached
+            p.reset()
+            hits = cache.hits
+            p.moveTo((100, 100))
+            p.lineTo((300, 100))
+            p.curveTo((400, 100), (400, 300), (220, 400))
+            p.closePath()
+            assert cache.hits > hits, model
+            assert cache.misses > misses, model
+
+            # Changing the nib invalidates the cached segments
+            p.configure(width=80)
+            misses = cache.misses
+            draw_guide(p)
+            assert cache.misses > misses, model
+
+    def test_profiler(self):
+        profiler = NibProfiler()
+        for model, pen_class in nib_models.items():
+            p = pen_class(None, radians(30), 60, 10, trace=True, profiler=profiler)
+            draw_guide(p)
+        data = profiler.as_dict()
+        for stage in ("lineTo", "curveToOne", "sampling", "tangents", "fitting"):
+            assert data["stages"][stage]["calls"] > 0, stage
+        for counter in ("samples", "paths", "segments", "points", "fitting_calls"):
+            assert data["counters"][counter] > 0, counter
+        trace = profiler.chrome_trace()
+        assert len(trace["traceEvents"]) == len(profiler.events) + 1
+
+    def test_split_at_extrema_batch(self):
+        curves = [
+            ((297, 52), (406, 52), (496, 142), (496, 251)),
+            ((0, 0), (0, 0), (100, 200), (300, 0)),
+            ((0, 0), (300, 300), (0, 300), (300, 0)),
+            ((0, 0), (100, 0), (200, 0), (300, 0)),
+            ((0, 0), (0, 0), (0, 0), (0, 0)),
+        ]
+        for angle in (0, 27, 90, -45):
+            t = Transform().rotate(radians(-angle))
+            rotated = [[t.transformPoint(pt) for pt in curve] for curve in curves]
+            segments, offsets = split_at_extrema_batch(np.array(rotated))
+            for i, curve in enumerate(rotated):
+                expected = split_at_extrema(*curve)
+                assert segments[offsets[i] : offsets[i + 1]].tolist() == [
+                    [list(pt) for pt in segment] for segment in expected
+                ], (angle, i)
+
+    def test_rect_batch_extrema(self):
+        def draw_waves(pen):
+            # A contour with enough curves to be split at the extrema in one batch
+            pen.moveTo((0, 0))
+            for i in range(16):
+                x = 100 * i
+                pen.curveTo((x + 30, 80), (x + 70, -80), (x + 100, 0))
+            pen.closePath()
+
+        paths = []
+        for batch in (1, 100):
+            with patch("nibLib.pens.rectNibPen.BATCH_EXTREMA_CURVES", batch):
+                p = RectNibPen(None, radians(30), 60, 10, trace=True)
+                draw_waves(p)
+            paths.append((list(p.path.coords), list(p.path.segment_types)))
+        assert paths[0] == paths[1]
+        assert len(paths[0][1]) > 16 * 6
+
+        # The buffered curves of a contour without closePath or endPath are stroked
+        # before the next contour starts
+        def draw_open_contours(pen, end):
+            pen.moveTo((0, 0))
+            for i in range(14):
+                x = 100 * i
+                pen.curveTo((x + 30, 80), (x + 70, -80), (x + 100, 0))
+            if end:
+                pen.endPath()
+            pen.moveTo((0, 500))
+            pen.curveTo((30, 580), (70, 420), (100, 500))
+            pen.endPath()
+
+        paths = []
+        for end in (False, True):
+            p = RectNibPen(None, radians(30), 60, 10, trace=True)
+            draw_open_contours(p, end)
+            paths.append((list(p.path.coords), list(p.path.segment_types)))
+        assert paths[0] == paths[1]
+
+    def test_components(self):
+        base = RecordingPen()
+        draw_guide(base)
+        transformations = (
+            (1, 0, 0, 1, 0, 300),
+            (1, 0, 0, 1, 250, -40),
+            (0.5, 0, 0, 1.5, 0, 300),
+        )
+        for model, pen_class in nib_models.items():
+            for transformation in transformations:
+                cache = StrokeCache()
+                p = pen_class(
+                    {"a": base},
+                    radians(30),
+                    60,
+                    10,
+                    trace=True,
+                    round_coords=True,
+                    component_cache=cache,
+                )
+                p.addComponent("a", transformation)
+                p.addComponent("a", transformation)
+                decomposed = pen_class(
+                    None, radians(30), 60, 10, trace=True, round_coords=True
+                )
+                draw_guide(TransformPen(decomposed, transformation))
+                draw_guide(TransformPen(decomposed, transformation))
+                a = RecordingPen()
+                p.draw_traced(a)
+                b = RecordingPen()
+                decomposed.draw_traced(b)
+                assert a.value == b.value, (model, transformation)
+                # Only translated components are cached
+                assert cache.hits == (1 if transformation[0] == 1 else 0)
+
+            # Without glyph set, components are ignored
+            decomposed.addComponent("a", (1, 0, 0, 1, 0, 0))
+            assert len(decomposed.path) == len(p.path)
+
+    def test_detail_level(self):
+        assert get_detail_level(2) == 0
+        assert get_detail_level(0.5) == 1
+        assert get_detail_level(0.1) == 3
+        assert get_detail_level(0) == MAX_DETAIL_LEVEL
+
+        def count_points(scale, trace=False):
+            sink = RecordingSink()
+            p = SuperellipseNibPen(
+                None, radians(30), 60, 10, nib_superness=3, trace=trace, sink=sink
+            )
+            p.set_scale(scale)
+            draw_guide(p)
+            rec = RecordingPen()
+            sink.replay(PenSink(rec))
+            return p.detail_level, sum(len(pts) for _, pts in rec.value)
+
+        level, full = count_points(1)
+        assert level == 0
+        level, reduced = count_points(0.1)
+        assert level == 3 and reduced < full
+        # Tracing is always done with full detail
+        assert count_points(0.1, trace=True)[0] == 0
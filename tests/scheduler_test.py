@@ -0,0 +1,50 @@
+import threading
+import time
+
+from unittest import TestCase
+
+from nibLib.scheduler import StrokeScheduler
+
+
+class StrokeSchedulerTest(TestCase):
+    def setUp(self):
+        self.results = []
+        self.finished = threading.Event()
+        self.scheduler = StrokeScheduler(self.on_result, delay=0.02)
+
+    def tearDown(self):
+        self.scheduler.close(timeout=1)
+
+    def on_result(self, key, result):
+        self.results.append((key, result))
+        self.finished.set()
+
+    def test_coalesce(self):
+        runs = []
+        for i in range(10):
+            self.scheduler.submit(i, lambda cancelled, i=i: runs.append(i) or i)
+        assert self.finished.wait(1)
+        # Only the latest job was run
+        assert runs == [9]
+        assert self.results == [(9, 9)]
+
+    def test_cancel(self):
+        started = threading.Event()
+        starts = []
+
+        def slow_job(cancelled):
+            starts.append(1)
+            started.set()
+            while not cancelled():
+                time.sleep(0.001)
+            return "slow"
+
+        self.scheduler.submit("slow", slow_job)
+        assert started.wait(1)
+        # The same key doesn't cancel the running job
+        self.scheduler.submit("slow", slow_job)
+        time.sleep(0.1)
+        assert self.scheduler.busy and len(starts) == 1
+        self.scheduler.submit("fast", lambda cancelled: "fast")
+        assert self.finished.wait(1)
+        assert self.results == [("fast", "fast")]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from math import radians
+from unittest import TestCase
+
+from fontTools.pens.recordingPen import RecordingPen
+from nibLib.pens.drawing import RecordingSink
+from nibLib.pens.superellipseNibPen import SuperellipseNibPen
+from nibLib.sweep import sweep_angles
+
+
+def record_guide():
+    guide = RecordingPen()
+    guide.moveTo((100, 100))
+    guide.lineTo((300, 100))
+    guide.curveTo((400, 100), (400, 300), (200, 400))
+    guide.closePath()
+    return guide
+
+
+class SweepTest(TestCase):
+    def test_trace(self):
+        guide = record_guide()
+        angles = [radians(a) for a in (0, 30, 75, 150)]
+        widths = [60, 60, 100, 60]
+        paths = sweep_angles(guide.value, angles, widths, 8, trace=True)
+        assert len(paths) == len(angles)
+        for angle, width, path in zip(angles, widths, paths):
+            p = SuperellipseNibPen(None, angle, width, 8, trace=True)
+            guide.replay(p)
+            expected = list(p.path.contours())
+            result = list(path.contours())
+            assert len(result) == len(expected)
+            for (points, types), (expected_points, expected_types) in zip(
+                result, expected
+            ):
+                assert list(types) == list(expected_types)
+                assert np.allclose(points, expected_points)
+
+    def test_preview(self):
+        guide = record_guide()
+        angles = np.radians(np.arange(0, 180, 10))
+        paths = sweep_angles(guide.value, angles, 60, 8)
+        for angle, path in zip(angles, paths):
+            sink = RecordingSink()
+            p = SuperellipseNibPen(None, angle, 60, 8, sink=sink)
+            guide.replay(p)
+            assert len(path) == len(sink.paths)
+            # The stroke of the line is the same as in the preview
+            assert np.allclose(list(path)[1], sink.paths[1][0])